@@ -0,0 +1,52 @@
+"""Compare the decode time and allocations of the available JSON codecs on recorded payloads
+
+Usage: python -m bench.json_codec [--number N]
+"""
+import argparse
+import importlib
+import timeit
+import tracemalloc
+
+from bench import payloads
+from gumo import codec as gumo_codec
+
+
+def available_codecs():
+    for name in gumo_codec.CODECS:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            continue
+        codec = gumo_codec.JSONCodec()
+        codec.use(name)
+        yield codec
+
+
+def measure(codec, data, number):
+    duration = min(timeit.repeat(lambda: codec.loads(data), number=number, repeat=3)) / number
+
+    tracemalloc.start()
+    codec.loads(data)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return duration, peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--number', type=int, default=200)
+    args = parser.parse_args()
+
+    codecs = list(available_codecs())
+    print(f"{'payload':<24}{'size (B)':>10}  {'codec':<8}{'decode (µs)':>14}{'peak alloc (KiB)':>18}{'vs json':>10}")
+    for name in payloads.RECORDED:
+        data = payloads.recorded(name)
+        results = {codec.name: measure(codec, data, args.number) for codec in codecs}
+        reference, reference_peak = results['json']
+        for codec_name, (duration, peak) in results.items():
+            print(f"{name:<24}{len(data):>10}  {codec_name:<8}{duration * 1e6:>14.1f}{peak / 1024:>18.1f}"
+                  f"{reference / duration:>9.2f}x  ({peak - reference_peak:+.0f} B allocated)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Compare the time and memory needed to wrap database records into model objects
+
+The previous model layer (column scan of the class attributes, one dict per record, __dict__ instances) is rebuilt
+here as a baseline. The records are dicts shaped like the `notifications` rows, they expose the same `get` and
+`items` methods as the asyncpg records.
+
+Usage: python -m bench.models [--rows 100000]
+"""
+import argparse
+import datetime
+import gc
+import time
+import tracemalloc
+
+from gumo.db import base
+from gumo.db import stream
+
+
+class LegacyNotification:
+
+    message_id = base.Column('bigint', primary_key=True)
+    user_id = base.Column('varchar(255)', nullable=False)
+    channel_id = base.Column('bigint', nullable=False)
+    stream_id = base.Column('varchar(255)', nullable=False)
+    created_at = base.Column('timestamp', nullable=False)
+    edited_at = base.Column('timestamp')
+    deleted_at = base.Column('timestamp')
+
+    @classmethod
+    def columns(cls):
+        return {name: definition for name, definition in vars(cls).items() if isinstance(definition, base.Column)}
+
+    def __init__(self, **kwargs):
+        for column in self.columns():
+            setattr(self, column, kwargs.get(column))
+
+
+def legacy_get_obj(record):
+    return LegacyNotification(**dict(record.items()))
+
+
+def get_records(rows):
+    created_at = datetime.datetime(2020, 1, 1)
+    return [{'message_id': 700000000000000000 + index, 'user_id': 10000000 + index % 5000,
+             'channel_id': 600000000000000000 + index % 200, 'stream_id': 30000000000 + index // 50,
+             'created_at': created_at, 'edited_at': created_at, 'deleted_at': None} for index in range(rows)]
+
+
+def measure(get_obj, records):
+    gc.collect()
+    started_at = time.perf_counter()
+    objects = [get_obj(record) for record in records]
+    duration = time.perf_counter() - started_at
+    del objects
+
+    gc.collect()
+    tracemalloc.start()
+    objects = [get_obj(record) for record in records]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del objects
+    return duration, size
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=100000)
+    args = parser.parse_args()
+
+    records = get_records(args.rows)
+    print(f"{'model':<10}{'time (ms)':>12}{'memory (MiB)':>15}")
+    for name, get_obj in (('legacy', legacy_get_obj), ('slotted', stream.Notification.from_record)):
+        duration, size = measure(get_obj, records)
+        print(f"{name:<10}{duration * 1000:>12.1f}{size / 1024 / 1024:>15.1f}")
+
+
+if __name__ == "__main__":
+    main()
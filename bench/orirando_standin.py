@@ -0,0 +1,61 @@
+"""Local stand-in for the orirando.com seed generator
+
+Serves `/generator/json` with payloads shaped and sized like the recorded ones, with an adjustable latency and
+failure rate. Point the bot to it with the `SEEDGEN_API_URL` config key.
+
+Usage: python -m bench.orirando_standin [--port 8080] [--latency 2.0] [--jitter 0.5] [--failure-rate 0.05]
+"""
+import argparse
+import asyncio
+import json
+import random
+
+from aiohttp import web
+
+from bench import payloads
+
+
+def create_app(latency=2.0, jitter=0.5, failure_rate=0.0):
+    app = web.Application()
+    app['stats'] = {'requests': 0, 'failures': 0}
+
+    async def generate(request):
+        app['stats']['requests'] += 1
+        await asyncio.sleep(max(0, random.gauss(latency, jitter)))
+        if random.random() < failure_rate:
+            app['stats']['failures'] += 1
+            return web.Response(status=500, text="Seed generation failed")
+        data = payloads.seedgen_response(request.query.get('seed', "0"),
+                                         verbose_paths='verbose_paths' in request.query)
+        return web.Response(body=json.dumps(data).encode('utf-8'), content_type="application/json")
+
+    app.router.add_get('/generator/json', generate)
+    return app
+
+
+async def start(host="127.0.0.1", port=0, **kwargs):
+    """Start the stand-in in the running loop
+
+    :return: the runner (to clean up) and the base URL
+    """
+    runner = web.AppRunner(create_app(**kwargs))
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    host, port = site._server.sockets[0].getsockname()[:2]
+    return runner, f"http://{host}:{port}"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default="127.0.0.1")
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--latency', type=float, default=2.0, help="mean generation time (s)")
+    parser.add_argument('--jitter', type=float, default=0.5, help="standard deviation of the generation time (s)")
+    parser.add_argument('--failure-rate', type=float, default=0.0)
+    args = parser.parse_args()
+    web.run_app(create_app(args.latency, args.jitter, args.failure_rate), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Payloads shaped and sized like the ones recorded from the Helix API and the orirando.com generator"""
+import json
+import random
+
+AREAS = ["SunkenGlades", "HollowGrove", "MoonGrotto", "GumoHideout", "Swamp", "Valley", "Forlorn", "Sorrow",
+         "Horu", "Ginso", "Blackroot", "LostGrove", "MistyWoods", "Glades"]
+ITEMS = ["Bash", "ChargeFlame", "WallJump", "Stomp", "DoubleJump", "ChargeJump", "Climb", "Glide", "Dash",
+         "Grenade", "GinsoKey", "ForlornKey", "HoruKey", "Water", "Wind", "Sunstone", "HealthCell",
+         "EnergyCell", "AbilityCell", "KeyStone", "MapStone", "GrottoTP", "GroveTP", "SwampTP", "ValleyTP",
+         "SorrowTP", "ForlornTP", "Experience"]
+CODES = ["SK", "EV", "HC", "EC", "AC", "KS", "MS", "TP", "EX", "RB"]
+
+
+def _location(rng, index):
+    area = rng.choice(AREAS)
+    return f"{area} {area}{rng.choice(['Plant', 'Map', 'EC', 'HC', 'AC', 'KS', 'EX'])}{index}", \
+        (rng.randint(-1000, 1000) * 4, rng.randint(-500, 500) * 4)
+
+
+def seed_header(seed_name, options="Standard,Clues,ForceTrees"):
+    return f"{options}|{seed_name}"
+
+
+def seed_file(seed_name, locations=259, rng=None):
+    rng = rng or random.Random(seed_name)
+    lines = [seed_header(seed_name)]
+    for index in range(locations):
+        _, (x, y) = _location(rng, index)
+        lines.append(f"{x * 10000 + y}|{rng.choice(CODES)}|{rng.randint(0, 200)}|{rng.choice(AREAS)}")
+    return "\n".join(lines) + "\n"
+
+
+def spoiler_file(seed_name, locations=259, verbose_paths=False, rng=None):
+    rng = rng or random.Random(seed_name)
+    lines = [seed_header(seed_name), "Difficulty Settings: Standard, Clues, ForceTrees", ""]
+    for group in range(locations // 8):
+        lines.append(f"{group}: {{ {', '.join(rng.sample(ITEMS, 3))} }}")
+        if verbose_paths:
+            for _ in range(40):
+                lines.append(f"    path: {' -> '.join(rng.sample(AREAS, 6))}")
+        for index in range(group * 8, group * 8 + 8):
+            location, (x, y) = _location(rng, index)
+            lines.append(f"    {rng.choice(ITEMS)} from {location} ({x}, {y})")
+    return "\n".join(lines) + "\n"
+
+
+def seedgen_response(seed_name="123456789", verbose_paths=False):
+    rng = random.Random(seed_name)
+    return {
+        'players': [{
+            'seed': seed_file(seed_name, rng=rng),
+            'spoiler': spoiler_file(seed_name, verbose_paths=verbose_paths, rng=rng),
+            'spoiler_url': f"/generator/spoiler/{seed_name}/1"
+        }],
+        'map_url': f"/generator/map/{seed_name}",
+        'history_url': f"/generator/history/{seed_name}"
+    }
+
+
+def helix_users(count=100):
+    return {'data': [{
+        'id': str(10000000 + index),
+        'login': f"streamer_{index}",
+        'display_name': f"Streamer_{index}",
+        'type': "",
+        'broadcaster_type': "affiliate",
+        'description': "Speedrunning and randomizer races " * 3,
+        'profile_image_url': f"https://static-cdn.jtvnw.net/jtv_user_pictures/{index}-profile_image-300x300.png",
+        'offline_image_url': "",
+        'view_count': index * 37
+    } for index in range(count)]}
+
+
+def helix_stream_event(user_id="10000000"):
+    return {'data': [{
+        'id': "39802394832",
+        'user_id': user_id,
+        'user_name': "Streamer_0",
+        'game_id': "19112",
+        'community_ids': [],
+        'type': "live",
+        'title': "Ori DE randomizer - weekly race, come hang out!",
+        'viewer_count': 245,
+        'started_at': "2019-03-01T19:02:13Z",
+        'language': "en",
+        'thumbnail_url': "https://static-cdn.jtvnw.net/previews-ttv/live_user_streamer_0-{width}x{height}.jpg"
+    }]}
+
+
+RECORDED = {
+    'helix-stream-event': lambda: helix_stream_event(),
+    'helix-users': lambda: helix_users(100),
+    'seedgen': lambda: seedgen_response(),
+    'seedgen-verbose-paths': lambda: seedgen_response(verbose_paths=True),
+}
+
+
+def recorded(name):
+    """Return a recorded payload, as the raw bytes received on the wire"""
+    return json.dumps(RECORDED[name]()).encode('utf-8')
@@ -0,0 +1,111 @@
+"""Drive the seed command path against the local generator stand-in
+
+Reports the throughput, the p50/p99 latency and the peak memory for several concurrency levels.
+
+Usage: python -m bench.seedgen [--requests 64] [--concurrency 1 4 16 64] [--latency 0.5] [--failure-rate 0.0]
+"""
+import argparse
+import asyncio
+import statistics
+import tempfile
+import time
+import tracemalloc
+import types
+
+from bench import orirando_standin
+from gumo import config
+from gumo import emoji
+
+
+class FakeMessage:
+
+    def __init__(self):
+        self.reactions = set()
+
+    async def add_reaction(self, reaction):
+        self.reactions.add(reaction)
+
+    async def remove_reaction(self, reaction, member):
+        self.reactions.discard(reaction)
+
+    async def edit(self, **kwargs):
+        pass
+
+    async def delete(self):
+        pass
+
+
+class FakeContext:
+    """Minimal command context, the uploads are read but not sent anywhere"""
+
+    def __init__(self, guild_id):
+        self.message = FakeMessage()
+        self.author = types.SimpleNamespace(display_name="bench")
+        self.guild = types.SimpleNamespace(id=guild_id, me=None, filesize_limit=8 * 1024 * 1024)
+        self.uploaded = 0
+
+    async def send(self, content=None, file=None, files=()):
+        for f in [file] if file else files:
+            self.uploaded += len(f.fp.read())
+        return FakeMessage()
+
+
+async def run_level(cog, concurrency, requests, guilds):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    contexts = []
+
+    async def run_one(index):
+        async with semaphore:
+            ctx = FakeContext(index % guilds)
+            contexts.append(ctx)
+            started_at = time.perf_counter()
+            await cog._seed(ctx, "expert clues wt=7")
+            latencies.append(time.perf_counter() - started_at)
+
+    tracemalloc.start()
+    started_at = time.perf_counter()
+    await asyncio.gather(*[run_one(index) for index in range(requests)])
+    elapsed = time.perf_counter() - started_at
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies.sort()
+    failures = len([ctx for ctx in contexts if emoji.CROSS_MARK in ctx.message.reactions])
+    print(f"{concurrency:>11}{requests / elapsed:>12.2f}{statistics.median(latencies):>10.3f}"
+          f"{latencies[int(0.99 * (len(latencies) - 1))]:>10.3f}{peak / 1024 / 1024:>12.1f}{failures:>10}")
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=64)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16, 64])
+    parser.add_argument('--guilds', type=int, default=8, help="number of guilds the requests are spread over")
+    parser.add_argument('--latency', type=float, default=0.5)
+    parser.add_argument('--jitter', type=float, default=0.1)
+    parser.add_argument('--failure-rate', type=float, default=0.0)
+    args = parser.parse_args()
+
+    runner, url = await orirando_standin.start(latency=args.latency, jitter=args.jitter,
+                                               failure_rate=args.failure_rate)
+
+    # Every request reaches the stand-in: the seed cache is disabled
+    config.update(SEEDGEN_API_URL=url, SEEDGEN_CACHE_SIZE=0, SEEDGEN_CACHE_FOLDER=tempfile.mkdtemp(),
+                  SEEDGEN_DAILY_OPTIONS=[])
+
+    from gumo.cogs.ori import seedgen
+    cog = seedgen.OriRandoSeedGenCommands(types.SimpleNamespace(loop=asyncio.get_running_loop()))
+    cog.cog_unload()
+
+    print(f"stand-in: {url}, latency={args.latency}s±{args.jitter}s, failure rate={args.failure_rate}, "
+          f"queue limits: {cog.queue.max_jobs} jobs, {cog.queue.max_group_jobs} per guild")
+    print(f"{'concurrency':>11}{'seeds/s':>12}{'p50 (s)':>10}{'p99 (s)':>10}{'peak (MiB)':>12}{'failures':>10}")
+    for concurrency in args.concurrency:
+        await run_level(cog, concurrency, args.requests, args.guilds)
+
+    await cog.client._session.close()
+    await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
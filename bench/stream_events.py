@@ -0,0 +1,189 @@
+"""Drive the Twitch webhook event path of the stream cog against the in-memory storage
+
+Each broadcaster is tracked in several channels, the benchmark replays an online event, a stream update and an
+offline event for each of them, and reports the mean handling time, the number of storage operations and the number
+of transactions per event. The Discord channels and the Twitch API are replaced with local fakes.
+
+Usage: python -m bench.stream_events [--broadcasters 200] [--channels 20] [--history 10000]
+"""
+import argparse
+import asyncio
+import collections
+import contextlib
+import datetime
+import itertools
+import time
+import types
+
+from gumo import db
+from gumo import guild_settings
+from gumo.cogs.stream import core
+
+_ids = itertools.count(10 ** 17)
+
+
+class FakeMessage:
+
+    def __init__(self, message_id=None, embed=None):
+        self.id = message_id or next(_ids)
+        self.embeds = [embed]
+
+    async def edit(self, content=None, embed=None):
+        self.embeds = [embed]
+
+    async def delete(self):
+        pass
+
+
+class FakeChannel:
+
+    def __init__(self, channel_id):
+        self.id = channel_id
+        self.name = f"channel-{channel_id}"
+        self.guild = types.SimpleNamespace(id=channel_id, name=f"guild-{channel_id}")
+        self.messages = {}
+
+    async def send(self, content=None, embed=None):
+        message = FakeMessage(embed=embed)
+        self.messages[message.id] = message
+        return message
+
+    async def fetch_message(self, message_id):
+        return self.messages[message_id]
+
+
+class FakeTwitchClient:
+
+    async def get_users(self, user_ids=(), user_logins=()):
+        return [{'id': user_id, 'login': f"user{user_id}", 'display_name': f"User{user_id}",
+                 'profile_image_url': None} for user_id in user_ids]
+
+    async def get_games(self, *game_ids):
+        return [{'id': game_id, 'name': "Ori and the Blind Forest"} for game_id in game_ids]
+
+
+class CountingTable:
+    """Count the operations run on a table"""
+
+    def __init__(self, table, counter):
+        self._table = table
+        self._counter = counter
+
+    def __getattr__(self, name):
+        method = getattr(self._table, name)
+
+        async def call(*args, **kwargs):
+            self._counter[name] += 1
+            return await method(*args, **kwargs)
+        return call
+
+
+class CountingStorage:
+
+    def __init__(self, storage, counter=None):
+        self._storage = storage
+        self.counter = collections.Counter() if counter is None else counter
+
+    def get_table(self, model):
+        return CountingTable(self._storage.get_table(model), self.counter)
+
+    @contextlib.asynccontextmanager
+    async def transaction(self):
+        self.counter['transaction'] += 1
+        async with self._storage.transaction() as storage:
+            yield CountingStorage(storage, self.counter)
+
+
+class FakeBot:
+
+    def __init__(self, channels):
+        self.loop = asyncio.get_running_loop()
+        self.pool = None
+        self.storage = CountingStorage(db.MemoryStorage())
+        self.replica_storage = None
+        self.schema_ready = asyncio.Event()
+        self.schema_ready.set()
+        self.channels = {channel_id: FakeChannel(channel_id) for channel_id in range(1, channels + 1)}
+        self.prefix_db_driver = db.PrefixDBDriver(self)
+        self.extension_db_driver = db.ExtensionDBDriver(self)
+        self.admin_role_db_driver = db.AdminRoleDBDriver(self)
+        self.guild_settings = guild_settings.GuildSettingsCache(self)
+
+    def get_channel(self, channel_id):
+        return self.channels.get(channel_id)
+
+
+def create_cog(bot):
+    cog = core.StreamCommands.__new__(core.StreamCommands)
+    cog.bot = bot
+    cog.client = FakeTwitchClient()
+    cog.user_db_driver = db.UserDBDriver(bot)
+    cog.channel_db_driver = db.ChannelDBDriver(bot)
+    cog.user_channel_db_driver = db.UserChannelDBDriver(bot)
+    cog.stream_db_driver = db.StreamDBDriver(bot)
+    cog.notification_db_driver = db.NotificationDBDriver(bot)
+    return cog
+
+
+async def populate(bot, cog, broadcasters, history):
+    channel_ids = list(bot.channels)
+    await bot.extension_db_driver.create(*[(channel_id, 'stream') for channel_id in channel_ids])
+    await cog.channel_db_driver.create(*[(channel_id, f"channel-{channel_id}", channel_id, f"guild-{channel_id}")
+                                         for channel_id in channel_ids])
+    user_ids = list(range(1, broadcasters + 1))
+    await cog.user_db_driver.create(*[(user_id, f"user{user_id}") for user_id in user_ids])
+    await cog.user_channel_db_driver.create(*[(channel_id, user_id, None)
+                                              for user_id in user_ids for channel_id in channel_ids])
+
+    # Old streams and notifications, the hot path queries are filtered and ordered over them
+    started_at = datetime.datetime(2020, 1, 1)
+    streams = [(10 ** 10 + index, 'live', user_ids[index % len(user_ids)], None,
+                started_at + datetime.timedelta(hours=index), started_at + datetime.timedelta(hours=index + 1))
+               for index in range(history)]
+    await cog.stream_db_driver.create(*streams)
+    await cog.notification_db_driver.create(*[(next(_ids), stream[2], channel_ids[index % len(channel_ids)],
+                                               stream[0], stream[4], stream[5], stream[5])
+                                              for index, stream in enumerate(streams)])
+    return user_ids
+
+
+async def replay(bot, cog, user_ids, event, get_body):
+    bot.storage.counter.clear()
+    started_at = time.perf_counter()
+    for user_id in user_ids:
+        topic = types.SimpleNamespace(params={'user_id': user_id})
+        await cog.on_webhook_event(topic, datetime.datetime.utcnow(), get_body(user_id))
+    elapsed = time.perf_counter() - started_at
+    transactions = bot.storage.counter.pop('transaction', 0)
+    operations = sum(bot.storage.counter.values())
+    print(f"{event:<10}{elapsed / len(user_ids) * 1000:>12.2f}{operations / len(user_ids):>12.1f}"
+          f"{transactions / len(user_ids):>14.1f}")
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--broadcasters', type=int, default=200)
+    parser.add_argument('--channels', type=int, default=20, help="number of channels tracking each broadcaster")
+    parser.add_argument('--history', type=int, default=10000, help="number of old streams and notifications")
+    args = parser.parse_args()
+
+    bot = FakeBot(args.channels)
+    cog = create_cog(bot)
+    user_ids = await populate(bot, cog, args.broadcasters, args.history)
+
+    def online(user_id):
+        return {'data': [{'id': 10 ** 11 + user_id, 'type': "live", 'user_id': user_id, 'game_id': 1,
+                          'title': "Any%"}]}
+
+    def updated(user_id):
+        return {'data': [{'id': 10 ** 11 + user_id, 'type': "live", 'user_id': user_id, 'game_id': 1,
+                          'title': "All skills"}]}
+
+    print(f"{'event':<10}{'ms/event':>12}{'db ops':>12}{'transactions':>14}")
+    await replay(bot, cog, user_ids, "online", online)
+    await replay(bot, cog, user_ids, "update", updated)
+    await replay(bot, cog, user_ids, "offline", lambda user_id: {'data': []})
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,12 +1,42 @@
 import asyncio
+import collections
 from datetime import datetime, timedelta
 import logging
 import math
+import re
+import time
+from urllib import parse
 
 import aiohttp
 
+from gumo.codec import codec
+from gumo import metrics
+
 LOG = logging.getLogger(__name__)
 
+# Path segments replaced by a placeholder to group the requests by route
+ROUTE_PARAMETER_REGEX = re.compile(r'/[0-9]+(?=/|$)')
+
+
+class RequestStats:
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = collections.Counter()
+        self.latency = metrics.Histogram()
+        self.rate_limit_wait = metrics.Histogram()
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+
+# Statistics of the outgoing requests, by (host, route)
+HTTP_METRICS = metrics.Registry(RequestStats)
+
+
+def get_route(url):
+    parsed_url = parse.urlsplit(url)
+    return parsed_url.netloc, ROUTE_PARAMETER_REGEX.sub("/{id}", parsed_url.path) or "/"
+
 
 class RateBucket:
 
@@ -65,13 +95,36 @@ class APIClient:
     async def request(self, method, url, return_json=False, **kwargs):
 
         LOG.debug(f"Outgoing request: {method.upper()} {url} (params={kwargs})")
+        stats = HTTP_METRICS[get_route(url)]
+        stats.requests += 1
+
+        if kwargs.get('json') is not None:
+            kwargs['data'] = codec.dumps(kwargs.pop('json')).encode('utf-8')
+            kwargs['headers'] = {'Content-Type': "application/json", **(kwargs.get('headers') or {})}
+        stats.bytes_out += len(kwargs.get('data') or b"")
+
         if self._bucket:
+            started_at = time.perf_counter()
             await self._bucket.consume()
+            stats.rate_limit_wait.observe(time.perf_counter() - started_at)
 
+        started_at = time.perf_counter()
         try:
             r = await self._session.request(method, url, **kwargs)
-            return await r.json() if return_json else await r.text()
+            body = await r.read()
+            stats.bytes_in += len(body)
+            if not return_json:
+                return await r.text()
+            try:
+                return codec.loads(body)
+            except ValueError as error:
+                # e.g. the HTML error page of a proxy
+                stats.errors['invalid_json'] += 1
+                output_error = APIError(f"Invalid JSON response ({r.content_type}): {error}")
+                LOG.error(output_error.message)
+                raise output_error
         except aiohttp.ClientResponseError as error:
+            stats.errors[error.status] += 1
             if 400 <= error.status < 500:
                 output_error = APIClientError(error)
                 LOG.error(output_error.message)
@@ -81,9 +134,12 @@ class APIClient:
                 LOG.error(output_error.message)
                 raise output_error
         except aiohttp.ClientError as error:
+            stats.errors[type(error).__name__] += 1
             output_error = APIError(str(error))
             LOG.error(output_error.message)
             raise output_error
+        finally:
+            stats.latency.observe(time.perf_counter() - started_at)
 
     async def get(self, uri, return_json=False, **kwargs):
         return await self.request("get", uri, return_json=return_json, **kwargs)
@@ -1,6 +1,12 @@
+import collections
 import logging
+import os
 
 from gumo.api import base
+from gumo import cache
+from gumo import config
+from gumo import models
+from gumo import utils
 
 LOG = logging.getLogger(__name__)
 
@@ -36,26 +42,219 @@ PRESETS['glitched'] = PRESETS['expert'] + ["glitched", "timed-level"]
 
 AMBIGUOUS_PRESETS = ["glitched"]
 
+GOAL_MODES = models.MultiKeyDict()
+GOAL_MODES['ft', 'forcetrees', 'force-trees'] = "ForceTrees"
+GOAL_MODES['wt', 'worldtour', 'world-tour'] = "WorldTour"
+GOAL_MODES['wf', 'warmthfrags', 'warmth-frags'] = "WarmthFrags"
+GOAL_MODES['fm', 'forcemapstones', 'force-mapstones'] = "ForceMapStones"
+
+PATH_DIFF_FLAGS = {"hard-path": "Hard", "easy-path": "Easy"}
+
+# Logic helper pickups
+SKILLS = models.MultiKeyDict()
+SKILLS['ba', 'bash'] = "SK|0"
+SKILLS['cf', 'chargeflame'] = "SK|2"
+SKILLS['wj', 'walljump'] = "SK|3"
+SKILLS['st', 'stomp'] = "SK|4"
+SKILLS['dj', 'doublejump'] = "SK|5"
+SKILLS['cj', 'chargejump'] = "SK|8"
+SKILLS['cl', 'climb'] = "SK|12"
+SKILLS['gl', 'glide'] = "SK|14"
+SKILLS['da', 'dash'] = "SK|50"
+SKILLS['gr', 'grenade'] = "SK|51"
+
+EVENTS = models.MultiKeyDict()
+EVENTS['watervein', 'wv'] = "EV|0"
+EVENTS['water', 'cleanwater'] = "EV|1"
+EVENTS['gumonseal', 'gs'] = "EV|2"
+EVENTS['wind', 'windrestored'] = "EV|3"
+EVENTS['sunstone', 'ss'] = "EV|4"
+
+CELLS_STONES = models.MultiKeyDict()
+CELLS_STONES['health', 'hc'] = "HC"
+CELLS_STONES['energy', 'ec'] = "EC"
+CELLS_STONES['keystone', 'ks'] = "KS"
+CELLS_STONES['mapstone', 'ms'] = "MS"
+
+TP_NAMES = ["swamp", "grove", "valley", "grotto", "forlorn", "sorrow"]
+
+# Token kinds
+PRESET = 'preset'
+KEY_MODE = 'key_mode'
+GOAL_MODE = 'goal_mode'
+VARIATION = 'variation'
+LOGIC_PATH = 'logic_path'
+FLAG = 'flag'
+PATH_DIFF = 'path_diff'
+SKILL = 'skill'
+EVENT = 'event'
+CELL_STONE = 'cell_stone'
+TELEPORTER = 'teleporter'
+
+
+def _compile_tokens():
+    tokens = collections.defaultdict(list)
+    sources = [(PRESET, {mode: mode for mode in LOGIC_MODES}),
+               (KEY_MODE, {mode: mode for mode in KEY_MODES}),
+               (GOAL_MODE, GOAL_MODES),
+               (VARIATION, {variation: variation for variation in VARIATIONS}),
+               (LOGIC_PATH, {path: path for path in LOGIC_PATHS}),
+               (FLAG, {flag: flag for flag in FLAGS}),
+               (PATH_DIFF, PATH_DIFF_FLAGS),
+               (SKILL, SKILLS),
+               (EVENT, EVENTS),
+               (CELL_STONE, CELLS_STONES),
+               (TELEPORTER, {f"{name}tp": f"TP|{name.capitalize()}" for name in TP_NAMES}),
+               (TELEPORTER, {f"tp{name}": f"TP|{name.capitalize()}" for name in TP_NAMES})]
+    for kind, values in sources:
+        for token, value in values.items():
+            tokens[token].append((kind, value))
+    return {token: tuple(kinds) for token, kinds in tokens.items()}
+
+
+# Map of lowercase token to the tuple of (kind, value) it stands for
+TOKENS = _compile_tokens()
+
+SeedOptions = collections.namedtuple('SeedOptions', ['preset', 'key_mode', 'path_diff', 'goal_modes', 'variations',
+                                                     'logic_paths', 'flags'])
+LogicHelperOptions = collections.namedtuple('LogicHelperOptions', ['preset', 'skills', 'events', 'cells_stones',
+                                                                   'teleporters'])
+
+
+def _get_goal_mode(goal_mode, value):
+    if goal_mode == "WorldTour":
+        return goal_mode, value if value.isdigit() else None
+    if goal_mode == "WarmthFrags":
+        frags_req, _, frags = value.partition("/")
+        return goal_mode, frags_req if frags_req.isdigit() else None, frags if frags.isdigit() else None
+    return goal_mode,
+
+
+def parse_seed_args(args):
+    """Classify the seed generation arguments in a single pass
+
+    :param args: the lowercase arguments
+    :return: the canonical SeedOptions
+    """
+    tokens = collections.defaultdict(list)
+    goal_modes = set()
+    for arg in args:
+        token, _, value = arg.partition('=')
+        for kind, name in TOKENS.get(token, ()):
+            if kind == GOAL_MODE:
+                goal_modes.add(_get_goal_mode(name, value))
+            elif token == arg:
+                tokens[kind].append(name)
+
+    logic_paths = set(tokens[LOGIC_PATH])
+    presets = tokens[PRESET]
+
+    # handle the ambiguous cases: take an unambiguous preset over an ambiguous one, otherwise make sure that the
+    # ambiguous preset used is not picked up as a logic path as well.
+    unambiguous_presets = [preset for preset in presets if preset not in AMBIGUOUS_PRESETS]
+    if unambiguous_presets:
+        preset = unambiguous_presets[0]
+    elif presets:
+        preset = presets[0]
+        if presets.count(preset) == 1:
+            logic_paths.discard(preset)
+    else:
+        preset = 'standard'
+
+    path_diffs = tokens[PATH_DIFF]
+    path_diff = "Hard" if "Hard" in path_diffs else next(iter(path_diffs), None)
+
+    options = SeedOptions(preset=preset,
+                          key_mode=next(iter(tokens[KEY_MODE]), None),
+                          path_diff=path_diff,
+                          goal_modes=tuple(sorted(goal_modes, key=str)),
+                          variations=tuple(sorted(set(tokens[VARIATION]))),
+                          logic_paths=tuple(sorted(logic_paths)),
+                          flags=tuple(sorted(set(tokens[FLAG]))))
+    LOG.debug(f"Seed options: {options}")
+    return options
+
+
+def parse_logic_args(args):
+    """Classify the logic helper arguments in a single pass
+
+    Pickups can be counted by appending "xN" to their name.
+
+    :param args: the lowercase arguments
+    :return: the canonical LogicHelperOptions
+    """
+    preset = "standard"
+    tokens = collections.defaultdict(set)
+    cells_stones = collections.Counter()
+
+    for arg in args:
+        kinds = dict(TOKENS.get(arg, ()))
+        if PRESET in kinds:
+            if preset != "standard":
+                LOG.debug(f"Got multiple presets. Using the latest {arg}")
+            preset = kinds[PRESET]
+            continue
+
+        name, _, count = arg.partition('x')
+        try:
+            count = int(count) if count else 1
+        except ValueError:
+            LOG.debug(f"Failed to get count from {arg}, will attempt to continue assuming there's only 1...")
+            count = 1
+
+        kinds = dict(TOKENS.get(name, ()))
+        for kind in (SKILL, EVENT, CELL_STONE, TELEPORTER):
+            if kind in kinds:
+                break
+        else:
+            LOG.error(f"Unrecognized pickup {name}")
+            continue
+
+        if kind == CELL_STONE:
+            cells_stones[kinds[kind]] += count
+        else:
+            tokens[kind].add(kinds[kind])
+        LOG.debug(f"Recognized {name} as {kinds[kind]}")
+
+    return LogicHelperOptions(preset=preset,
+                              skills=tuple(sorted(tokens[SKILL])),
+                              events=tuple(sorted(tokens[EVENT])),
+                              cells_stones=tuple(sorted(cells_stones.items())),
+                              teleporters=tuple(sorted(tokens[TELEPORTER])))
+
+
+DEFAULT_CACHE_SIZE = 256 * 1024 * 1024
+
 
 class OriRandomizerAPIClient(base.APIClient):
 
     def __init__(self, loop):
         super().__init__(loop=loop)
+        self._loop = loop
+        self.base_url = config.get('SEEDGEN_API_URL', SEEDGEN_API_URL)
+        cache_folder = config.get('SEEDGEN_CACHE_FOLDER', os.path.join(utils.get_project_dir(), 'cache', 'seeds'))
+        self._cache = cache.DiskCache(cache_folder, config.get('SEEDGEN_CACHE_SIZE', DEFAULT_CACHE_SIZE))
 
-    async def get_data(self, seed, preset, key_mode=None, path_diff=None, goal_modes=(), variations=(), logic_paths=(),
-                       flags=()):
-        """ Retrieve the seed and spoiler download links
-
-        :param seed: The seed number
-        :param preset: The seed logic mode preset
-        :param key_mode: The seed mode
-        :param path_diff: The seed path difficulty
-        :param goal_modes: The goal modes
-        :param variations: An optional list of variations
-        :param logic_paths: An optional list of additional logic paths
-        :param flags: Any other flags
+    async def get_data(self, seed, options):
+        """ Retrieve the seed and spoiler data
+
+        :param seed: The seed name
+        :param options: The SeedOptions
         :return: seed and spoiler data
         """
+        return await self.generate(self.get_params(seed, options))
+
+    @staticmethod
+    def get_params(seed, options):
+        """ Build the canonical generation parameters
+
+        The generation is deterministic for a given set of parameters, they are used as cache key.
+
+        :param seed: The seed name
+        :param options: The SeedOptions built by `parse_seed_args`
+        :return: the sorted parameters as a tuple of (key, value)
+        """
+        preset, key_mode, path_diff, goal_modes, variations, logic_paths, flags = options
 
         params = {("seed", seed)}
 
@@ -105,7 +304,28 @@ class OriRandomizerAPIClient(base.APIClient):
         elif preset == 'standard':
             params.add(('cell_freq', 40))
 
-        LOG.debug(f"Parameters used for the seed generation: {params}")
+        return tuple(sorted((key, str(value)) for key, value in params))
+
+    async def get_cached(self, params):
+        """ Retrieve the seed and spoiler data from the cache, None if they have not been generated yet
+
+        :param params: the parameters built by `get_params`
+        """
+        return await self._loop.run_in_executor(None, self._cache.get, params)
 
+    async def generate(self, params):
+        """ Retrieve the seed and spoiler data, from the cache or the generator
+
+        :param params: the parameters built by `get_params`
+        :return: seed and spoiler data
+        """
+        data = await self.get_cached(params)
+        if data:
+            LOG.debug("Seed data found in the cache")
+            return data
+
+        LOG.debug(f"Parameters used for the seed generation: {params}")
         uri = "/generator/json?" + "&".join([f"{key}={value}" for key, value in params])
-        return await self.get(f"{SEEDGEN_API_URL}/{uri}", return_json=True)
+        data = await self.get(f"{self.base_url}{uri}", return_json=True)
+        await self._loop.run_in_executor(None, self._cache.put, params, data)
+        return data
@@ -8,6 +8,11 @@ from gumo.api.twitch import token
 LOG = logging.getLogger(__name__)
 
 
+def parse_id(value):
+    """Convert a Twitch id (a numeric string, empty when not set) to the integer stored in the database"""
+    return int(value) if value else None
+
+
 class TwitchAPIClient(base.APIClient):
 
     def __init__(self, loop):
@@ -24,6 +29,8 @@ class TwitchAPIClient(base.APIClient):
         url = f"{TWITCH_API_URL}/users?{parse.urlencode(params)}"
         headers = await self._token_session.get_authorization_headers()
         body = await self.get(url, return_json=True, headers=headers)
+        for user in body['data']:
+            user['id'] = parse_id(user['id'])
         return body['data']
 
     async def get_games(self, *game_ids):
@@ -34,4 +41,6 @@ class TwitchAPIClient(base.APIClient):
         url = f"{TWITCH_API_URL}/games?{parse.urlencode([('id', game_id) for game_id in game_ids])}"
         headers = await self._token_session.get_authorization_headers()
         body = await self.get(url, return_json=True, headers=headers)
+        for game in body['data']:
+            game['id'] = parse_id(game['id'])
         return body['data']
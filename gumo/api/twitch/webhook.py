@@ -18,7 +18,9 @@ from sanic import response
 from gumo.api import base
 from gumo.api.twitch import TWITCH_API_URL
 from gumo import config
+from gumo.api.twitch import base as twitch_base
 from gumo.api.twitch import token
+from gumo.codec import codec
 
 
 LOG = logging.getLogger(__name__)
@@ -196,7 +198,13 @@ class TwitchWebhookServer(base.APIClient):
         # timestamp = iso8601.parse_date(request.headers['twitch-notification-timestamp']).replace(tzinfo=None)
         timestamp = datetime.utcnow()
 
-        self._loop.create_task(self._callback(topic, timestamp, request.json))
+        try:
+            body = codec.loads(request.body)
+        except ValueError:
+            LOG.warning(f"Invalid JSON payload received for {topic}")
+            return response.HTTPResponse(status=400)
+
+        self._loop.create_task(self._callback(topic, timestamp, topic.parse_body(body)))
         return response.HTTPResponse(status=202)
 
     async def start(self):
@@ -263,6 +271,10 @@ class Topic(abc.ABC):
     def as_uri(self):
         return f"{TWITCH_API_URL}/{self.endpoint}?{parse.urlencode(self.params)}"
 
+    def parse_body(self, body):
+        """Convert the values of a notification body, e.g. the Twitch ids to integers"""
+        return body
+
     @classmethod
     def get_topic_from_url(cls, url):
         parsed_url = parse.urlparse(url)
@@ -282,3 +294,13 @@ class StreamChanged(Topic):
     valid_params = ('user_id',)
 
     endpoint = "streams"
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.params['user_id'] = twitch_base.parse_id(self.params['user_id'])
+
+    def parse_body(self, body):
+        for stream in body.get('data', []):
+            for key in ('id', 'user_id', 'game_id'):
+                stream[key] = twitch_base.parse_id(stream[key])
+        return body
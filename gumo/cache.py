@@ -0,0 +1,100 @@
+import collections
+import gzip
+import hashlib
+import logging
+import os
+import threading
+
+from gumo.codec import codec
+
+LOG = logging.getLogger(__name__)
+
+EXTENSION = ".json.gz"
+
+
+class DiskCache:
+    """LRU cache storing compressed JSON documents on the disk.
+
+    The recency of the entries is persisted through the modification time of the files so that the cache survives a
+    restart. When the total size of the files exceeds `max_size`, the least recently used entries are evicted.
+    The methods are blocking and are meant to be run in an executor.
+    """
+
+    def __init__(self, folder, max_size):
+        self.folder = folder
+        self.max_size = max_size
+        self.size = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        os.makedirs(self.folder, exist_ok=True)
+        files = [entry for entry in os.scandir(self.folder) if entry.name.endswith(EXTENSION)]
+        for entry in sorted(files, key=lambda entry: entry.stat().st_mtime):
+            self._entries[entry.path] = entry.stat().st_size
+            self.size += entry.stat().st_size
+        LOG.debug(f"{len(self._entries)} entries loaded from the cache '{self.folder}' ({self.size} bytes)")
+        self._evict()
+
+    def _get_path(self, key):
+        digest = hashlib.sha256(repr(key).encode('utf-8')).hexdigest()
+        return os.path.join(self.folder, digest + EXTENSION)
+
+    def _evict(self):
+        while self.size > self.max_size and self._entries:
+            path, size = self._entries.popitem(last=False)
+            self.size -= size
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            LOG.debug(f"Cache entry evicted: {path} ({size} bytes)")
+
+    def get(self, key):
+        """Return the cached document, None if the key is missing
+
+        :param key: any object with a stable repr
+        """
+        path = self._get_path(key)
+        with self._lock:
+            if path not in self._entries:
+                return None
+            self._entries.move_to_end(path)
+        try:
+            with gzip.open(path, 'rb') as f:
+                data = codec.loads(f.read())
+            os.utime(path)
+        except (OSError, ValueError):
+            LOG.exception(f"Cannot read the cache entry {path}")
+            with self._lock:
+                self.size -= self._entries.pop(path, 0)
+            return None
+        return data
+
+    def put(self, key, data):
+        """Store a JSON serializable document, a write failure is logged and ignored
+
+        :param key: any object with a stable repr
+        :param data: the document
+        """
+        if not self.max_size:
+            return
+        path = self._get_path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with gzip.open(tmp_path, 'wb') as f:
+                f.write(codec.dumps(data).encode('utf-8'))
+            size = os.path.getsize(tmp_path)
+            os.replace(tmp_path, path)
+        except OSError:
+            LOG.warning(f"Cannot write the cache entry {path}", exc_info=True)
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return
+        with self._lock:
+            self.size += size - self._entries.pop(path, 0)
+            self._entries[path] = size
+            self._evict()
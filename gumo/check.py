@@ -17,7 +17,7 @@ async def is_admin(ctx):
     if await ctx.bot.is_owner(ctx.author):
         return True
 
-    admin_roles = [role for role in ctx.bot.admin_roles[ctx.guild.id]]
+    admin_roles = (await ctx.bot.guild_settings.get(ctx.guild.id)).admin_roles
     author_roles = [role.id for role in ctx.author.roles]
 
     # if there is no admin role, returns True
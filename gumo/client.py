@@ -1,4 +1,4 @@
-import collections
+import asyncio
 from concurrent import futures
 import logging
 
@@ -7,7 +7,9 @@ from discord.ext import commands
 
 from gumo import db
 from gumo import config
+from gumo.codec import codec
 from gumo import emoji
+from gumo import guild_settings
 
 LOG = logging.getLogger(__name__)
 
@@ -35,7 +37,7 @@ async def get_prefix(bot, message):
     if isinstance(message.channel, discord.DMChannel):
         prefixes = [DEFAULT_COMMAND_PREFIX]
     else:
-        prefixes = bot.prefixes[message.guild.id]
+        prefixes = (await bot.guild_settings.get(message.guild.id)).prefixes
     return commands.when_mentioned_or(*prefixes)(bot, message)
 
 
@@ -47,9 +49,15 @@ class Bot(commands.Bot):
         intents.members = True
 
         super().__init__(*args, command_prefix=get_prefix, intents=intents, **kwargs)
+        if config.get('JSON_CODEC'):
+            codec.use(config['JSON_CODEC'], 'json')
         self.pool = None
-        self.prefixes = collections.defaultdict(set)
-        self.admin_roles = collections.defaultdict(set)
+        self.storage = None
+        self.replica_pool = None
+        self.replica_storage = None
+        self.schema_ready = asyncio.Event()
+        self.guild_settings = guild_settings.GuildSettingsCache(self)
+        self._guild_settings_listener = None
         self.remove_command('help')
         self.add_check(self.check_extension_access)
         self.load_extensions()
@@ -60,16 +68,28 @@ class Bot(commands.Bot):
 
     async def prepare(self):
 
-        # Initialize database drivers
-        await self.prefix_db_driver.init()
-        await self.extension_db_driver.init()
-        await self.admin_role_db_driver.init()
+        if config.get('DATABASE_BACKEND', 'postgres') == 'memory':
+            LOG.warning("The data is kept in memory, it will be lost when the bot stops")
+            self.storage = db.MemoryStorage()
+        else:
+            self.pool = await db.create_pool()
+
+            # Bring the schema up to date before the database drivers (including the cog ones) are used
+            await db.migrate(self.pool, db.get_models())
+            self.storage = db.PostgresStorage(self.pool)
 
-        for prefix in await self.prefix_db_driver.list():
-            self.prefixes[prefix.guild_id].add(prefix.name)
+            # The reads accepting a stale result are run on the replica, if any
+            if config.get('DATABASE_REPLICA_CREDENTIALS'):
+                self.replica_pool = await db.create_pool('DATABASE_REPLICA_CREDENTIALS')
+                self.replica_storage = db.PostgresStorage(self.replica_pool)
+        self.schema_ready.set()
 
-        for admin_role in await self.admin_role_db_driver.list():
-            self.admin_roles[admin_role.guild_id].add(admin_role.id)
+        await asyncio.gather(self.prefix_db_driver.init(), self.extension_db_driver.init(),
+                             self.admin_role_db_driver.init())
+
+        # The guild settings are loaded on first use, the other processes notify their changes
+        if self.pool:
+            self._guild_settings_listener = self.loop.create_task(self.guild_settings.listen())
 
     async def on_ready(self):
         LOG.debug(f"Bot is connected | username: {self.user} | user id: {self.user.id}")
@@ -87,8 +107,7 @@ class Bot(commands.Bot):
 
         extension_name = ctx.cog.__module__.split(".", 2)[-1]
 
-        whitelist = {ext.name for ext in await self.extension_db_driver.list(guild_id=ctx.guild.id)}
-        whitelist = DEFAULT_EXTENSIONS | whitelist
+        whitelist = DEFAULT_EXTENSIONS | (await self.guild_settings.get(ctx.guild.id)).extensions
         return any(extension_name.startswith(name) for name in whitelist)
 
     async def on_command_error(self, ctx, error):
@@ -141,6 +160,17 @@ class Bot(commands.Bot):
         except ConnectionError:
             LOG.exception("Cannot connect to the websocket")
 
+    async def close(self):
+        await super().close()
+        if self._guild_settings_listener:
+            # The listener closes its connection before the pools are closed
+            self._guild_settings_listener.cancel()
+            await asyncio.gather(self._guild_settings_listener, return_exceptions=True)
+        if self.pool:
+            await self.pool.close()
+        if self.replica_pool:
+            await self.replica_pool.close()
+
     def load_extensions(self):
         """Load all the extensions"""
         for extension in EXTENSIONS:
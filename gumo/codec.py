@@ -0,0 +1,67 @@
+import importlib
+import logging
+
+LOG = logging.getLogger(__name__)
+
+# Supported JSON libraries
+CODECS = ('orjson', 'ujson', 'json')
+
+# Libraries used when none is configured, by order of preference. ujson does not decode every document like the
+# standard library (e.g. the large numbers and the invalid surrogates), it is only used when chosen explicitly
+DEFAULT_CODECS = ('orjson', 'json')
+
+
+def _get_functions(name, module):
+    if name == 'orjson':
+        return module.loads, lambda obj: module.dumps(obj).decode('utf-8')
+    if name == 'json':
+        return module.loads, lambda obj: module.dumps(obj, separators=(',', ':'))
+    return module.loads, module.dumps
+
+
+class JSONCodec:
+    """Wrapper around the JSON library used to decode and encode the payloads exchanged with external services.
+
+    The fastest available library of `DEFAULT_CODECS` is used, the standard library being the fallback.
+    """
+
+    def __init__(self):
+        self.name = None
+        self._loads = None
+        self._dumps = None
+        self.use(*DEFAULT_CODECS)
+
+    def use(self, *names):
+        """Switch to the first library that can be imported
+
+        :param names: the library names, by order of preference
+        :return: the name of the library in use
+        """
+        for name in names:
+            if name not in CODECS:
+                LOG.warning(f"Unknown JSON codec '{name}'")
+                continue
+            try:
+                module = importlib.import_module(name)
+            except ImportError:
+                LOG.debug(f"The JSON codec '{name}' is not available")
+                continue
+            self._loads, self._dumps = _get_functions(name, module)
+            self.name = name
+            LOG.debug(f"JSON codec in use: {name}")
+            return name
+        raise ValueError(f"None of the JSON codecs are available: {names}")
+
+    def loads(self, data):
+        """Decode a JSON document
+
+        :param data: the document as bytes or str
+        """
+        return self._loads(data)
+
+    def dumps(self, obj):
+        """Encode an object as a JSON str"""
+        return self._dumps(obj)
+
+
+codec = JSONCodec()
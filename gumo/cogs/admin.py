@@ -7,13 +7,17 @@ import discord
 from discord.ext import commands
 from discord.ext.commands import converter, errors
 
+from gumo.api import base as api_base
 from gumo import check
 from gumo import client
 from gumo import config
+from gumo.db import pool as db_pool
 from gumo import emoji
 
 LOG = logging.getLogger(__name__)
 
+METRICS_TOP_SIZE = 15
+
 
 class GlobalRoleConverter(converter.IDConverter):
 
@@ -78,17 +82,12 @@ class AdminCommands(commands.Cog):
     async def prefix_add(self, ctx, new_prefix, guild_id=None):
         guild = self.bot.get_guild(int(guild_id)) if guild_id else ctx.guild
         await self.bot.prefix_db_driver.create((guild.id, new_prefix))
-        self.bot.prefixes[ctx.guild.id].add(new_prefix)
         await ctx.message.add_reaction(emoji.WHITE_CHECK_MARK)
 
     @prefix.command(name="rm", hidden=True)
     async def prefix_rm(self, ctx, new_prefix, guild_id=None):
         guild = self.bot.get_guild(int(guild_id)) if guild_id else ctx.guild
         await self.bot.prefix_db_driver.delete(guild_id=guild.id, name=new_prefix)
-        try:
-            self.bot.prefixes[ctx.guild.id].remove(new_prefix)
-        except ValueError:
-            pass
         await ctx.message.add_reaction(emoji.WHITE_CHECK_MARK)
 
     @commands.group(hidden=True)
@@ -122,7 +121,6 @@ class AdminCommands(commands.Cog):
             raise errors.BadArgument("Guild '{}' not found.".format(guild_id))
         admin_role = await GlobalRoleConverter().convert(argument, guild)
         await self.bot.admin_role_db_driver.create((guild.id, admin_role.id))
-        self.bot.admin_roles[ctx.guild.id].add(admin_role.id)
         await ctx.message.add_reaction(emoji.WHITE_CHECK_MARK)
 
     @role.command(name="rm", hidden=True)
@@ -132,12 +130,52 @@ class AdminCommands(commands.Cog):
             raise errors.BadArgument("Guild '{}' not found.".format(guild_id))
         admin_role = await GlobalRoleConverter().convert(argument, guild)
         await self.bot.admin_role_db_driver.delete(guild_id=guild.id, id=admin_role.id)
-        try:
-            self.bot.admin_roles[ctx.guild.id].remove(admin_role.id)
-        except ValueError:
-            pass
         await ctx.message.add_reaction(emoji.WHITE_CHECK_MARK)
 
+    @commands.group(hidden=True)
+    @commands.check(check.is_owner)
+    async def metrics(self, ctx):
+        pass
+
+    @metrics.command(name="http", hidden=True)
+    async def metrics_http(self, ctx, reset: bool = False):
+        lines = [f"{'route':<45}{'calls':>7}{'err':>5}{'avg':>8}{'p99':>8}{'wait':>8}{'in (KiB)':>10}{'out':>7}"]
+        for (host, route), stats in api_base.HTTP_METRICS.top(METRICS_TOP_SIZE, key=lambda stats: stats.latency.sum):
+            lines.append(f"{(host + route)[-44:]:<45}{stats.requests:>7}{sum(stats.errors.values()):>5}"
+                         f"{stats.latency.mean:>7.2f}s{stats.latency.quantile(0.99):>7.2f}s"
+                         f"{stats.rate_limit_wait.sum:>7.1f}s{stats.bytes_in // 1024:>10}{stats.bytes_out // 1024:>7}")
+        if reset:
+            api_base.HTTP_METRICS.clear()
+        await ctx.send("```\n" + "\n".join(lines) + "\n```")
+
+    @metrics.command(name="db", hidden=True)
+    async def metrics_db(self, ctx, reset: bool = False):
+        lines = [f"{'statement':<60}{'calls':>7}{'err':>5}{'rows':>8}{'avg':>9}{'p99':>9}{'total':>9}"]
+        for query, stats in db_pool.QUERY_METRICS.top(METRICS_TOP_SIZE, key=lambda stats: stats.latency.sum):
+            lines.append(f"{' '.join(query.split())[:59]:<60}{stats.calls:>7}{stats.errors:>5}{stats.rows:>8}"
+                         f"{stats.latency.mean * 1000:>7.1f}ms{stats.latency.quantile(0.99) * 1000:>7.1f}ms"
+                         f"{stats.latency.sum:>8.1f}s")
+        if reset:
+            db_pool.QUERY_METRICS.clear()
+        await ctx.send("```\n" + "\n".join(lines) + "\n```")
+
+    @metrics.command(name="pool", hidden=True)
+    async def metrics_pool(self, ctx):
+        if not self.bot.pool:
+            await ctx.send("No database pool, the data is kept in memory")
+            return
+        lines = []
+        for name, pool in (('primary', self.bot.pool), ('replica', self.bot.replica_pool)):
+            if not pool:
+                continue
+            stats = pool.stats
+            lines += [f"{name} | size: {pool.min_size}-{pool.max_size} | in use: {stats.in_use} "
+                      f"(max {stats.max_in_use}) | waiting: {stats.waiting}",
+                      f"acquired: {stats.acquired} | timeouts: {stats.timeouts} | wait avg: "
+                      f"{stats.acquire_wait.mean * 1000:.1f}ms p99: {stats.acquire_wait.quantile(0.99) * 1000:.1f}ms "
+                      f"max: {stats.acquire_wait.max * 1000:.1f}ms"]
+        await ctx.send("```\n" + "\n".join(lines) + "\n```")
+
 
 def setup(bot):
     bot.add_cog(AdminCommands(bot))
@@ -112,7 +112,7 @@ class DabCommands(commands.Cog, role.RoleCommands):
     async def stats(self, ctx, *, member: discord.Member=None):
 
         author = member or ctx.author
-        records = await self.driver.get_user_data(ctx.guild.id, author.id)
+        records = await self.driver.get_user_data(ctx.guild.id, author.id, stale=True)
 
         nemesis = collections.defaultdict(lambda: 0)
         victims = collections.defaultdict(lambda: 0)
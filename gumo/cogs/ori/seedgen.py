@@ -1,8 +1,10 @@
-from datetime import datetime
+import asyncio
+from datetime import datetime, time, timedelta
 import io
 import logging
 import random
 import re
+import zipfile
 
 import discord
 from discord.ext import commands
@@ -11,22 +13,121 @@ import pytz
 
 from gumo import api
 from gumo.api import ori_randomizer
+from gumo.cogs.ori import spoiler
+from gumo import config
 from gumo import emoji
-from gumo import models
+from gumo import jobs
 
 LOG = logging.getLogger(__name__)
 
 SEED_FILENAME = "randomizer.dat"
 SPOILER_FILENAME = "spoiler.txt"
+ARCHIVE_FILENAME = "seeds.zip"
+SPOILER_ARCHIVE_FILENAME = "spoiler.zip"
 
-GOAL_MODES = models.MultiKeyDict()
-GOAL_MODES['ft', 'forcetrees', 'force-trees'] = "ForceTrees"
-GOAL_MODES['wt', 'worldtour', 'world-tour'] = "WorldTour"
-GOAL_MODES['wf', 'warmthfrags', 'warmth-frags'] = "WarmthFrags"
-GOAL_MODES['fm', 'forcemapstones', 'force-mapstones'] = "ForceMapStones"
+# Spoilers bigger than this size (in bytes) are sent compressed
+SPOILER_COMPRESSION_THRESHOLD = 1024 * 1024
+
+SPOILER_MAX_RESULTS = 20
+
+# Size of the record ending a zip archive without comment, the entries of an archive add up to the rest of its size
+ZIP_END_RECORD_SIZE = 22
+
+# Argument used to generate several seeds at once (e.g. "x5")
+BATCH_REGEX = re.compile(r'^x([0-9]+)$')
+SEEDGEN_MAX_BATCH = 10
 
 SEEDGEN_COOLDOWN = 0
 
+# Maximum number of seeds generated at the same time, globally and by guild
+SEEDGEN_MAX_JOBS = 10
+SEEDGEN_MAX_GUILD_JOBS = 2
+
+# The seeds of the batches have their own allowance by guild, so that a whole batch can be generated at once and takes
+# about the time of its slowest seed. The batches still count towards the global limit, which bounds the load on the
+# generator: a lower `SEEDGEN_MAX_JOBS` trades the batch latency for a lighter load.
+SEEDGEN_MAX_GUILD_BATCH_JOBS = SEEDGEN_MAX_BATCH
+
+DAILY_TIMEZONE = pytz.timezone('US/Pacific')
+
+# Option sets whose daily seed is generated ahead of time, and delay after the daily rollover
+DAILY_PREGEN_OPTIONS = [""]
+DAILY_PREGEN_DELAY = 60
+
+# The failed pre-generations are retried until the next rollover, the delay doubling after each attempt (in seconds)
+DAILY_PREGEN_RETRY_DELAY = 60
+DAILY_PREGEN_MAX_RETRY_DELAY = 60 * 30
+
+
+def get_daily_seed_name():
+    return pytz.UTC.localize(datetime.utcnow()).astimezone(DAILY_TIMEZONE).strftime("%Y-%m-%d")
+
+
+def get_header(text):
+    """Return the first line of a text without splitting the whole text"""
+    end = text.find("\n")
+    return text if end == -1 else text[:end]
+
+
+def build_archive(files):
+    """Build a zip archive in memory
+
+    :param files: list of (filename, content)
+    :return: the archive buffer
+    """
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for filename, content in files:
+            archive.writestr(filename, content)
+    buffer.seek(0)
+    return buffer
+
+
+def get_archived_size(files):
+    """Return the size added by files to a zip archive, each file being compressed on its own
+
+    :param files: list of (filename, content)
+    :return: the size of the entries of the files (in bytes)
+    """
+    return build_archive(files).getbuffer().nbytes - ZIP_END_RECORD_SIZE
+
+
+def build_archives(file_groups, max_size):
+    """Build zip archives no bigger than a size, each one holding the files of consecutive groups
+
+    Each group is compressed once to measure it, the archives are then built from the groups that fit together.
+    A group too big on its own is archived with its first file only (e.g. the seed without its spoiler).
+
+    :param file_groups: list of lists of (filename, content)
+    :param max_size: the maximum size of an archive (in bytes)
+    :return: list of archive buffers
+    """
+    archived_file_groups = []
+    archived_files = []
+    archived_size = ZIP_END_RECORD_SIZE
+    for files in file_groups:
+        size = get_archived_size(files)
+        if size + ZIP_END_RECORD_SIZE > max_size:
+            LOG.warning(f"The files {[filename for filename, _ in files[1:]]} are too big to be sent")
+            files = files[:1]
+            size = get_archived_size(files)
+        if archived_files and archived_size + size > max_size:
+            archived_file_groups.append(archived_files)
+            archived_files = []
+            archived_size = ZIP_END_RECORD_SIZE
+        archived_files = archived_files + files
+        archived_size += size
+    if archived_files:
+        archived_file_groups.append(archived_files)
+    return [build_archive(files) for files in archived_file_groups]
+
+
+def get_next_daily_rollover():
+    """Return the number of seconds before the next daily seed"""
+    now = pytz.UTC.localize(datetime.utcnow()).astimezone(DAILY_TIMEZONE)
+    rollover = DAILY_TIMEZONE.localize(datetime.combine(now.date() + timedelta(days=1), time()))
+    return (rollover - now).total_seconds()
+
 
 class OriRandoSeedGenCommands(commands.Cog):
 
@@ -34,6 +135,15 @@ class OriRandoSeedGenCommands(commands.Cog):
         self.display_name = "Ori rando"
         self.bot = bot
         self.client = ori_randomizer.OriRandomizerAPIClient(self.bot.loop)
+        self.queue = jobs.JobQueue(self.bot.loop, config.get('SEEDGEN_MAX_JOBS', SEEDGEN_MAX_JOBS),
+                                   config.get('SEEDGEN_MAX_GUILD_JOBS', SEEDGEN_MAX_GUILD_JOBS))
+        self.spoilers = spoiler.SpoilerIndex(config.get('SPOILER_INDEX_SIZE', spoiler.SPOILER_INDEX_SIZE),
+                                             config.get('SPOILER_INDEX_MAX_ENTRIES', spoiler.SPOILER_INDEX_MAX_ENTRIES))
+        self.tasks = [self.bot.loop.create_task(self.pregenerate_daily_seeds())]
+
+    def cog_unload(self):
+        for task in self.tasks:
+            task.cancel()
 
     @staticmethod
     def _pop_seed_codes(args):
@@ -42,91 +152,168 @@ class OriRandoSeedGenCommands(commands.Cog):
             args = args.replace(seed_code, "")
         return args, seed_codes
 
-    async def _get_seed_data(self, seed_name, args):
-        goal_modes = []
-        for arg in args:
-            token, _, value = arg.partition('=')
-            if token in GOAL_MODES:
-                token = GOAL_MODES[token]
-                if token == GOAL_MODES['ft'] or token == GOAL_MODES['fm']:
-                    goal_modes.append((token,))
-                elif token == GOAL_MODES['wt']:
-                    goal_modes.append((token, value if value.isdigit() else None))
-                elif token == GOAL_MODES['wf']:
-                    frags_req, _, frags = value.partition("/")
-                    goal_modes.append((token,
-                                       frags_req if frags_req.isdigit() else None,
-                                       frags if frags.isdigit() else None))
-
-        def get_matching(target_list):
-            matching_vals = [arg for arg in args if arg in target_list]
-            return matching_vals
-
-        logic_presets = get_matching(ori_randomizer.LOGIC_MODES)
-
-        # handle the ambiguous cases.
-        unambiguous_presets = [preset for preset in logic_presets if preset not in ori_randomizer.AMBIGUOUS_PRESETS]
-        if len(logic_presets) != len(unambiguous_presets):
-            if unambiguous_presets:
-                # take an unambiguous preset over an ambiguous one
-                logic_presets = unambiguous_presets
-            else:
-                # if we don't have an unambiguous preset, remove the one we're going to use so it doesn't get picked
-                # up as a variation or logic path.
-                args.remove(logic_presets[0])
-
-        key_modes = get_matching(ori_randomizer.KEY_MODES)
-        variations = get_matching(ori_randomizer.VARIATIONS)
-        logic_paths = get_matching(ori_randomizer.LOGIC_PATHS)
-        flags = get_matching(ori_randomizer.FLAGS)
+    def _get_seed_params(self, seed_name, args):
+        options = ori_randomizer.parse_seed_args(args)
+        return self.client.get_params(seed_name, options)
 
-        LOG.debug(f"presets={logic_presets}, key_modes={key_modes}, goal_modes={goal_modes}, variations={variations}, "
-                  f"paths={logic_paths}, flags={flags}")
+    async def _generate(self, ctx, params, batch=False):
+        """Generate a seed through the queue, identical pending requests share the same generation
 
-        path_diff = None
-        if "hard-path" in args:
-            path_diff = "Hard"
-        elif "easy-path" in args:
-            path_diff = "Easy"
+        :param batch: whether the seed is part of a batch, limited by the batch allowance of the guild and generated
+        without displaying its position in the queue
+        """
 
-        logic_preset = logic_presets[0] if logic_presets else 'standard'
-        key_mode = key_modes[0] if key_modes else None
-        return await self.client.get_data(seed_name, logic_preset, key_mode, path_diff, goal_modes, variations,
-                                          logic_paths, flags)
+        data = await self.client.get_cached(params)
+        if data:
+            return data
+
+        queue_message = None
+
+        async def on_position(position):
+            nonlocal queue_message
+            if position and not queue_message:
+                await ctx.message.add_reaction(emoji.HOURGLASS)
+                queue_message = await ctx.send(f"Seed generation queued (position: **{position}**)")
+            elif position:
+                await queue_message.edit(content=f"Seed generation queued (position: **{position}**)")
+            elif queue_message:
+                await ctx.message.remove_reaction(emoji.HOURGLASS, ctx.guild.me)
+                await queue_message.delete()
+
+        if batch:
+            return await self.queue.submit(params, ('batch', ctx.guild.id), lambda: self.client.generate(params),
+                                           max_group_jobs=config.get('SEEDGEN_MAX_GUILD_BATCH_JOBS',
+                                                                     SEEDGEN_MAX_GUILD_BATCH_JOBS))
+        return await self.queue.submit(params, ctx.guild.id, lambda: self.client.generate(params), on_position)
+
+    async def _index_spoiler(self, player):
+        seed_spoiler = await self.bot.loop.run_in_executor(None, spoiler.Spoiler, get_header(player['seed']),
+                                                           player['spoiler'])
+        self.spoilers.add(seed_spoiler)
 
     async def _send_seed(self, ctx, data):
+        player = data['players'][0]
+
+        # Encode the files only once, the buffers share the memory of the encoded data
+        seed = player['seed'].encode('utf-8')
+        spoiler = player['spoiler'].encode('utf-8')
 
-        # Store the data into file buffers
-        seed_buffer = io.BytesIO(bytes(data['players'][0]['seed'], encoding="utf8"))
-        spoiler_buffer = io.BytesIO(bytes(data['players'][0]['spoiler'], encoding="utf8"))
+        files = [discord.File(io.BytesIO(seed), filename=SEED_FILENAME)]
+        threshold = config.get('SPOILER_COMPRESSION_THRESHOLD', SPOILER_COMPRESSION_THRESHOLD)
+        if len(spoiler) > threshold or len(seed) + len(spoiler) > ctx.guild.filesize_limit:
+            archive_buffer = await self.bot.loop.run_in_executor(None, build_archive, [(SPOILER_FILENAME, spoiler)])
+            LOG.debug(f"Spoiler compressed: {len(spoiler)} -> {archive_buffer.getbuffer().nbytes} bytes")
+            files.append(discord.File(archive_buffer, filename=SPOILER_ARCHIVE_FILENAME))
+        else:
+            files.append(discord.File(io.BytesIO(spoiler), filename=SPOILER_FILENAME))
 
         # Send the files in the chat
-        seed_header = data['players'][0]['seed'].split("\n")[0]
         message = f"Seed requested by **{ctx.author.display_name}**\n"
-        message += f"`{seed_header}`\n"
-        message += f"**Spoiler link**: {ori_randomizer.SEEDGEN_API_URL + data['players'][0]['spoiler_url']}\n"
+        message += f"`{get_header(player['seed'])}`\n"
+        message += f"**Spoiler link**: {ori_randomizer.SEEDGEN_API_URL + player['spoiler_url']}\n"
         if "map_url" in data and "history_url" in data:
             message += f"**Map**: {ori_randomizer.SEEDGEN_API_URL + data['map_url']}\n"
             message += f"**History**: {ori_randomizer.SEEDGEN_API_URL + data['history_url']}\n"
 
-        await ctx.send(message, files=[discord.File(seed_buffer, filename=SEED_FILENAME),
-                                       discord.File(spoiler_buffer, filename=SPOILER_FILENAME)])
+        await ctx.send(message, files=files)
         LOG.debug(f"The files have correctly been sent in Discord")
+        await self._index_spoiler(player)
+
+    async def _send_seeds(self, ctx, seeds):
+        """Send several seeds as a single archive
+
+        :param seeds: list of seed data
+        """
+        file_groups = []
+        message = f"{len(seeds)} seeds requested by **{ctx.author.display_name}**\n"
+        for index, data in enumerate(seeds, 1):
+            player = data['players'][0]
+            seed_header = get_header(player['seed'])
+            file_groups.append([(f"{index}/{SEED_FILENAME}", player['seed']),
+                                (f"{index}/{SPOILER_FILENAME}", player['spoiler'])])
+            message += f"**{index}**: `{seed_header}` (<{ori_randomizer.SEEDGEN_API_URL + player['spoiler_url']}>)\n"
+
+        # The seeds are split across several archives if they do not fit in a single upload
+        archives = await self.bot.loop.run_in_executor(None, build_archives, file_groups, ctx.guild.filesize_limit)
+        for index, archive_buffer in enumerate(archives, 1):
+            filename = ARCHIVE_FILENAME if len(archives) == 1 else ARCHIVE_FILENAME.replace(".", f"-{index}.", 1)
+            await ctx.send(message if index == 1 else None, file=discord.File(archive_buffer, filename=filename))
+        LOG.debug(f"The seeds have correctly been sent in Discord ({len(archives)} archives)")
+        for data in seeds:
+            await self._index_spoiler(data['players'][0])
+
+    async def _generate_batch(self, ctx, args, count, seed_name=None):
+        """Generate several seeds with the same options concurrently"""
+
+        seed_names = [f"{seed_name}-{index}" if seed_name else str(random.randint(1, 1000000000))
+                      for index in range(1, count + 1)]
+        results = await asyncio.gather(*[self._generate(ctx, self._get_seed_params(name, args), batch=True)
+                                         for name in seed_names], return_exceptions=True)
+
+        seeds = [result for result in results if not isinstance(result, Exception)]
+        for error in [result for result in results if isinstance(result, Exception)]:
+            if not isinstance(error, api.APIError):
+                raise error
+            LOG.error(f"A seed of the batch could not be generated: {error}")
+        if not seeds:
+            raise results[0]
+        await self._send_seeds(ctx, seeds)
 
     async def _seed(self, ctx, args, seed_name=None):
-        if not seed_name:
-            seed_name = str(random.randint(1, 1000000000))
         args = [arg.lower() for arg in args.split()]
+
+        counts = [int(BATCH_REGEX.match(arg).group(1)) for arg in args if BATCH_REGEX.match(arg)]
+        args = [arg for arg in args if not BATCH_REGEX.match(arg)]
+        count = min(counts[0] if counts else 1, config.get('SEEDGEN_MAX_BATCH', SEEDGEN_MAX_BATCH))
+
         await ctx.message.add_reaction(emoji.ARROWS_COUNTERCLOCKWISE)
         try:
-            data = await self._get_seed_data(seed_name, args)
-            await self._send_seed(ctx, data)
+            if count > 1:
+                await self._generate_batch(ctx, args, count, seed_name)
+            else:
+                params = self._get_seed_params(seed_name or str(random.randint(1, 1000000000)), args)
+                data = await self._generate(ctx, params)
+                await self._send_seed(ctx, data)
             await ctx.message.remove_reaction(emoji.ARROWS_COUNTERCLOCKWISE, ctx.guild.me)
         except (api.APIError, discord.HTTPException):
             await ctx.message.remove_reaction(emoji.ARROWS_COUNTERCLOCKWISE, ctx.guild.me)
             await ctx.message.add_reaction(emoji.CROSS_MARK)
             LOG.exception(f"An error has occurred while generating the seed")
 
+    async def pregenerate_daily_seeds(self):
+        """Generate the daily seeds of the most used option sets right after the daily rollover"""
+        LOG.debug("Daily seeds pre-generation task running...")
+        while True:
+            seed_name = get_daily_seed_name()
+            pending_options = list(config.get('SEEDGEN_DAILY_OPTIONS', DAILY_PREGEN_OPTIONS))
+            retry_delay = DAILY_PREGEN_RETRY_DELAY
+            while pending_options:
+                pending_options = await self._pregenerate_daily_seeds(seed_name, pending_options)
+                if not pending_options or retry_delay >= get_next_daily_rollover():
+                    break
+                LOG.warning(f"Retrying the daily seeds of the options {pending_options} in {retry_delay}s")
+                await asyncio.sleep(retry_delay)
+                retry_delay = min(retry_delay * 2, DAILY_PREGEN_MAX_RETRY_DELAY)
+            await asyncio.sleep(get_next_daily_rollover() + config.get('SEEDGEN_DAILY_DELAY', DAILY_PREGEN_DELAY))
+
+    async def _pregenerate_daily_seeds(self, seed_name, options_list):
+        """Generate the daily seed of each option set
+
+        :return: the option sets whose seed could not be generated
+        """
+        failed_options = []
+        for options in options_list:
+            params = self._get_seed_params(seed_name, [arg.lower() for arg in options.split()])
+            try:
+                await self.queue.submit(params, None, lambda: self.client.generate(params))
+                LOG.debug(f"Daily seed '{seed_name}' generated for the options '{options}'")
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                LOG.exception(f"Cannot generate the daily seed '{seed_name}' for the options '{options}'")
+                failed_options.append(options)
+        return failed_options
+
     @commands.command()
     @commands.guild_only()
     @commands.cooldown(1, SEEDGEN_COOLDOWN, BucketType.guild)
@@ -146,6 +333,8 @@ class OriRandoSeedGenCommands(commands.Cog):
         - **variations**: `starved`, `hard`, `OHKO`, `0XP`, `closeddungeons`, `openworld`, `doubleskills`, `strictmapstones`, `bonuspickups`, `nonprogressmapstones`
 
         - **flags**: `tracking`, `verbose_paths`, `classic_gen`, `hard-path`, `easy-path`
+
+        *Generate several seeds with the same options in a single archive by adding "xN" (e.g. `x5`).*
         """
         args, seed_codes = self._pop_seed_codes(args)
         LOG.debug(f"Valid seed codes found: {seed_codes}")
@@ -161,8 +350,33 @@ class OriRandoSeedGenCommands(commands.Cog):
         Refer to the `seed` command's help to get the list of valid parameters
         """
         args, _ = self._pop_seed_codes(args)
-        seed_name = pytz.UTC.localize(datetime.now()).astimezone(pytz.timezone('US/Pacific')).strftime("%Y-%m-%d")
-        await self._seed(ctx, args, seed_name)
+        await self._seed(ctx, args, get_daily_seed_name())
+
+    @commands.command(usage='where <seed> <item or location>')
+    @commands.guild_only()
+    async def where(self, ctx, seed, *, query):
+        """Look up an item or a location in the spoiler of a recently generated seed
+
+        The seed can be referred to by its name (use quotes if it contains spaces) or by its header.
+
+        **Examples**:
+            where is Bash in the seed 123456: `!where 123456 Bash`
+            what is in the first energy vault of the daily seed: `!where 2019-03-01 FirstEnergyVault`
+        """
+        seed_spoiler = self.spoilers.get(seed)
+        if not seed_spoiler:
+            LOG.warning(f"The spoiler of the seed '{seed}' is not indexed")
+            await ctx.message.add_reaction(emoji.CROSS_MARK)
+            return
+
+        results = seed_spoiler.find(query)
+        if not results:
+            await ctx.send(f"`{query}` not found in the spoiler of `{seed_spoiler.header}`")
+            return
+
+        message = f"`{seed_spoiler.header}` - **{query}**:\n"
+        message += "\n".join(f"‣ {result}" for result in results[:SPOILER_MAX_RESULTS])
+        await ctx.send(message)
 
 
 def setup(bot):
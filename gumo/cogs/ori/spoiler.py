@@ -0,0 +1,97 @@
+import collections
+import logging
+import re
+
+LOG = logging.getLogger(__name__)
+
+# e.g. "    Bash from SunkenGlades FirstEnergyVault (-280, -256)"
+PICKUP_REGEX = re.compile(r'^\s*(?P<item>\S.*?) from (?P<location>.+?)\s*$', re.MULTILINE)
+COORDINATES_REGEX = re.compile(r'\s*\([-0-9, ]+\)$')
+
+SPOILER_INDEX_SIZE = 50
+
+# Total number of entries of the lookup tables kept in the index, a pickup counts for its item entry and for up to 3
+# location entries (a seed has a few hundred pickups)
+SPOILER_INDEX_MAX_ENTRIES = 200000
+
+
+class Spoiler:
+    """Spoiler parsed into lookup tables of the item locations and of the location items
+
+    The size of a spoiler is the number of entries of its lookup tables.
+    """
+
+    def __init__(self, header, text):
+        self.header = header
+        self.size = 0
+        self.locations_by_item = collections.defaultdict(list)
+        self.items_by_location = collections.defaultdict(list)
+
+        for match in PICKUP_REGEX.finditer(text):
+            item, location = match.group('item'), match.group('location')
+            self.locations_by_item[item.lower()].append(location)
+            # The same string is shared by the location keys
+            item_location = f"{item} ({location})"
+            location_keys = self._get_location_keys(location)
+            for key in location_keys:
+                self.items_by_location[key].append(item_location)
+            self.size += 1 + len(location_keys)
+
+    @staticmethod
+    def _get_location_keys(location):
+        """A location can be found by its full name, its name without coordinates and its last component"""
+        name = COORDINATES_REGEX.sub("", location).lower()
+        return {location.lower(), name, name.rsplit(" ", 1)[-1]}
+
+    def find(self, query):
+        """Return the locations of an item, or the items at a location
+
+        :param query: the item or location name
+        :return: a list of results
+        """
+        query = query.strip().lower()
+        return self.locations_by_item.get(query) or self.items_by_location.get(query) or []
+
+
+class SpoilerIndex:
+    """LRU collection of the spoilers of the recently generated seeds, indexed by seed header and seed name
+
+    The spoilers are evicted once there are more than `max_size` of them or once their lookup tables hold more than
+    `max_entries` entries in total.
+    """
+
+    def __init__(self, max_size=SPOILER_INDEX_SIZE, max_entries=SPOILER_INDEX_MAX_ENTRIES):
+        self.max_size = max_size
+        self.max_entries = max_entries
+        self.size = 0
+        self._spoilers = collections.OrderedDict()
+        self._headers_by_name = {}
+
+    @staticmethod
+    def _get_seed_name(header):
+        return header.rsplit("|", 1)[-1].lower()
+
+    def add(self, spoiler):
+        if spoiler.header in self._spoilers:
+            self.size -= self._spoilers.pop(spoiler.header).size
+        self._spoilers[spoiler.header] = spoiler
+        self._headers_by_name[self._get_seed_name(spoiler.header)] = spoiler.header
+        self.size += spoiler.size
+
+        while len(self._spoilers) > self.max_size or (self.size > self.max_entries and len(self._spoilers) > 1):
+            header, evicted = self._spoilers.popitem(last=False)
+            self.size -= evicted.size
+            if self._headers_by_name.get(self._get_seed_name(header)) == header:
+                del self._headers_by_name[self._get_seed_name(header)]
+            LOG.debug(f"Spoiler evicted from the index: {header}")
+
+    def get(self, seed):
+        """Return the spoiler of a seed, None if it is not indexed
+
+        :param seed: the seed header or the seed name
+        """
+        header = seed if seed in self._spoilers else self._headers_by_name.get(seed.lower())
+        if header not in self._spoilers:
+            return None
+        self._spoilers.move_to_end(header)
+        return self._spoilers[header]
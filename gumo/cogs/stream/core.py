@@ -1,12 +1,13 @@
 import asyncio
 import collections
-from datetime import datetime
+from datetime import datetime, timedelta
 import logging
 
 from discord import errors
 from discord.ext import commands
 
 from gumo import api
+from gumo import config
 from gumo.api import twitch
 from gumo.check import is_admin
 from gumo.cogs.stream import models
@@ -18,6 +19,19 @@ LOG = logging.getLogger(__name__)
 RECENT_NOTIFICATION_AGE = 300
 OLD_NOTIFICATION_LIFESPAN = 60 * 60 * 24
 
+# The ended streams and the deleted notifications are archived (or dropped) after these delays (in days)
+STREAM_HISTORY_RETENTION = 90
+NOTIFICATION_HISTORY_RETENTION = 30
+HISTORY_RETENTION_INTERVAL = 60 * 60 * 6
+
+NOTIFICATION_COLUMNS = ['user_id', 'channel_id', 'stream_id', 'message_id', 'created_at']
+
+# Columns written by each change of a notification state, the other columns of the row are left as they are
+NOTIFICATION_DELETED_COLUMNS = ('deleted_at',)
+NOTIFICATION_OFFLINE_COLUMNS = ('edited_at',)
+NOTIFICATION_LIVE_COLUMNS = ('stream_id', 'edited_at')
+NOTIFICATION_LIVE_DELETED_COLUMNS = ('deleted_at', 'edited_at')
+
 
 class MissingStreamName(commands.MissingRequiredArgument):
 
@@ -48,17 +62,16 @@ class StreamCommands(commands.Cog):
 
     async def init(self):
         """Initialize all the manager attributes and load the database data."""
-        await self.user_db_driver.init()
-        await self.channel_db_driver.init()
-        await self.user_channel_db_driver.init()
-        await self.stream_db_driver.init()
-        await self.notification_db_driver.init()
+        await asyncio.gather(self.user_db_driver.init(), self.channel_db_driver.init(),
+                             self.user_channel_db_driver.init(), self.stream_db_driver.init(),
+                             self.notification_db_driver.init())
 
         await self.webhook_server.start()
         await self.bot.wait_until_ready()
 
         self.tasks.append(self.bot.loop.create_task(self.update_subscriptions()))
         self.tasks.append(self.bot.loop.create_task(self.delete_old_notifications()))
+        self.tasks.append(self.bot.loop.create_task(self.purge_history()))
 
         def task_done_callback(fut):
             if fut.cancelled():
@@ -72,7 +85,11 @@ class StreamCommands(commands.Cog):
             task.add_done_callback(task_done_callback)
 
     async def on_webhook_event(self, topic, timestamp, body):
-        """Method called when a webhook event is received"""
+        """Method called when a webhook event is received
+
+        The database is read before the Discord notifications are sent or edited, and all the resulting changes are
+        written at the end in a single transaction.
+        """
 
         stream_data = body.get('data')
         user_id = topic.params['user_id']
@@ -84,10 +101,8 @@ class StreamCommands(commands.Cog):
 
             stream_data = stream_data[0]
 
-            await self._on_stream_update(timestamp, user_data, stream_data)
-
-            # Make sure that any previous stream entry is has an end date
-            await self.stream_db_driver.update('ended_at', timestamp, user_id=user_id, ended_at=None)
+            notifications_to_update, notifications_to_create = \
+                await self._on_stream_update(timestamp, user_data, stream_data)
 
             data = {
                 'id': stream_data['id'],
@@ -96,12 +111,27 @@ class StreamCommands(commands.Cog):
                 'game_id': stream_data['game_id'],
                 'started_at': timestamp
             }
-            await self.stream_db_driver.create(data.values(), columns=data.keys())
+
+            async with self.bot.storage.transaction() as storage:
+                notification_db_driver = self.notification_db_driver.bind(storage)
+                stream_db_driver = self.stream_db_driver.bind(storage)
+
+                await self._update_notifications(notification_db_driver, notifications_to_update)
+                await notification_db_driver.create(*notifications_to_create, columns=NOTIFICATION_COLUMNS)
+
+                # Make sure that any previous stream entry is has an end date
+                await stream_db_driver.update('ended_at', timestamp, user_id=user_id, ended_at=None)
+                await stream_db_driver.create(data.values(), columns=data.keys())
 
         else:
             await self._on_stream_offline(timestamp, user_data)
 
     async def _on_stream_update(self, timestamp, user_data, stream_data):
+        """Send or edit the notifications of a stream
+
+        :return: the notifications to update (see `_edit_notifications`) and the notifications to create, as
+        (user_id, channel_id, stream_id, message_id, created_at) tuples
+        """
 
         game_id = stream_data['game_id']
 
@@ -122,12 +152,15 @@ class StreamCommands(commands.Cog):
         new_embed = models.NotificationEmbed(broadcast_type=broadcast_type, login=login, display_name=display_name,
                                              title=title, game=game, logo=logo)
 
-        last_stream = await self.stream_db_driver.get(user_id=user_data['id'], order_by='started_at', desc=True)
+        last_stream, user_channels = await asyncio.gather(
+            self.stream_db_driver.get(user_id=user_data['id'], order_by='started_at', desc=True),
+            self.user_channel_db_driver.list(user_id=user_data['id']))
 
         # Get the last stream to distinguish 3 cases:
         # - If the stream id didn't change, then the broadcaster is already live and has updated their stream
         # - If the stream id changed but the last stream was recent then we re use the same notifications
         # - Else, the broadcaster went online after some time offline
+        previous_stream_id = None
         if last_stream and last_stream.id == stream_data['id']:
             stream_id = last_stream.id
         elif last_stream and last_stream.ended_at and \
@@ -135,19 +168,25 @@ class StreamCommands(commands.Cog):
             stream_id = last_stream.id
         else:
             stream_id = stream_data['id']
-
-            if last_stream:
-                # Edit old notifications in case a "stream offline" notification has been missed
-                old_notifications = await self.notification_db_driver.list(stream_id=last_stream.id, edited_at=None,
-                                                                           deleted_at=None)
-                await self._edit_notifications(timestamp, user_data, old_notifications)
-
-        user_channels = await self.user_channel_db_driver.list(user_id=user_data['id'])
-        notifications = await self.notification_db_driver.list(stream_id=stream_id, deleted_at=None)
+            previous_stream_id = last_stream.id if last_stream else None
 
         tags_by_channel_id = {user_channel.channel_id: user_channel.tags for user_channel in user_channels}
         channels_by_id = {user_channel.channel_id: self.bot.get_channel(user_channel.channel_id)
                           for user_channel in user_channels}
+
+        # The notifications of the previous stream are fetched along with the current ones
+        stream_ids = [stream_id] + [previous_stream_id] * bool(previous_stream_id)
+        guild_ids = list({channel.guild.id for channel in channels_by_id.values()})
+        notifications, settings_by_guild_id = await asyncio.gather(
+            self.notification_db_driver.list(stream_id=stream_ids, deleted_at=None),
+            self.bot.guild_settings.get_many(guild_ids))
+
+        # Edit old notifications in case a "stream offline" notification has been missed
+        old_notifications = [notification for notification in notifications
+                             if notification.stream_id == previous_stream_id and not notification.edited_at]
+        notifications_to_update = await self._edit_notifications(timestamp, user_data, old_notifications)
+
+        notifications = [notification for notification in notifications if notification.stream_id == stream_id]
         notifications_by_channel_id = {notification.channel_id: notification for notification in notifications}
 
         channels_edit = [channels_by_id[notification.channel_id] for notification in notifications]
@@ -164,56 +203,82 @@ class StreamCommands(commands.Cog):
                 LOG.warning(f"Notification for {display_name} in channel "
                             f"{channel.guild.name}#{channel.name} has most likely been manually deleted, updating the "
                             f"database")
-                await self.notification_db_driver.update('deleted_at', timestamp, message_id=notification.message_id)
+                notifications_to_update[NOTIFICATION_LIVE_DELETED_COLUMNS].append(
+                    (notification.message_id, timestamp, None))
+                channels_edit.remove(channel)
+                continue
+            except errors.HTTPException:
+                LOG.exception(f"Cannot fetch the notification for {display_name} in channel "
+                              f"{channel.guild.name}#{channel.name}")
                 channels_edit.remove(channel)
-            else:
-                # Edit the notification and the related stream_id
+                continue
+
+            # Edit the notification and the related stream_id
+            try:
                 await message.edit(content=f"{tags_by_channel_id[channel.id] or ''} {message_content}", embed=new_embed)
-                await self.notification_db_driver.update('stream_id', stream_data['id'],
-                                                         message_id=notification.message_id)
-            await self.notification_db_driver.update('edited_at', None, message_id=notification.message_id)
+            except errors.HTTPException:
+                LOG.exception(f"Cannot edit the notification for {display_name} in channel "
+                              f"{channel.guild.name}#{channel.name}")
+                channels_edit.remove(channel)
+                continue
+            notifications_to_update[NOTIFICATION_LIVE_COLUMNS].append(
+                (notification.message_id, stream_data['id'], None))
 
         if channels_edit:
             channel_str = [f"{channel.guild.name}#{channel.name}" for channel in channels_edit]
             LOG.debug(f"{display_name} is already online or was live recently (less than "
                       f"{RECENT_NOTIFICATION_AGE}s), recent notification have been edited: {', '.join(channel_str)}")
 
+        enabled_guild_ids = {guild_id for guild_id, settings in settings_by_guild_id.items()
+                             if 'stream' in settings.extensions}
         notifications_to_create = []
         for channel in channels_send[:]:
 
             # Discard notifications if the extension is not enabled in this guild
-            enabled_extensions = await self.bot.extension_db_driver.list(guild_id=channel.guild.id)
-            enabled_extension_names = {ext.name for ext in enabled_extensions}
-            if 'stream' not in enabled_extension_names:
+            if channel.guild.id not in enabled_guild_ids:
                 LOG.debug(f"The stream extension is not enabled on the server '{channel.guild.name}', "
                           f"the notifications are not sent")
                 continue
 
-            message = await channel.send(content=f"{tags_by_channel_id[channel.id] or ''} {message_content}",
-                                         embed=new_embed)
+            try:
+                message = await channel.send(content=f"{tags_by_channel_id[channel.id] or ''} {message_content}",
+                                             embed=new_embed)
+            except errors.HTTPException:
+                LOG.exception(f"Cannot send the notification for {display_name} in channel "
+                              f"{channel.guild.name}#{channel.name}")
+                continue
 
             values = (user_data['id'], channel.id, stream_data['id'], message.id, timestamp)
             notifications_to_create.append(values)
 
         if channels_send:
-            columns = ['user_id', 'channel_id', 'stream_id', 'message_id', 'created_at']
-            await self.notification_db_driver.create(*notifications_to_create, columns=columns)
             channel_str = [f"{channel.guild.name}#{channel.name}" for channel in channels_send]
             LOG.debug(f"Notifications for {display_name} sent: {', '.join(channel_str)}")
 
+        return notifications_to_update, notifications_to_create
+
     async def _on_stream_offline(self, timestamp, user_data):
         """Method called if the twitch stream is going offline"""
 
-        active_streams = await self.stream_db_driver.list(user_id=user_data['id'], ended_at=None)
-
-        for active_stream in active_streams:
-            await self.stream_db_driver.update('ended_at', timestamp, id=active_stream.id, ended_at=None)
-
         active_notifications = await self.notification_db_driver.list(user_id=user_data['id'], edited_at=None,
                                                                       deleted_at=None)
-        await self._edit_notifications(timestamp, user_data, active_notifications)
+        notifications_to_update = await self._edit_notifications(timestamp, user_data, active_notifications)
+
+        async with self.bot.storage.transaction() as storage:
+            await self.stream_db_driver.bind(storage).update('ended_at', timestamp, user_id=user_data['id'],
+                                                             ended_at=None)
+            await self._update_notifications(self.notification_db_driver.bind(storage), notifications_to_update)
 
     async def _edit_notifications(self, timestamp, user_data, notifications):
+        """Mark the notifications as offline
+
+        A notification that cannot be edited is left as it is, so that the others are still recorded.
+
+        :return: the notifications to update, as a dict of the updated columns to lists of (message_id, *values)
+        tuples
+        """
+
+        notifications_to_update = collections.defaultdict(list)
 
         for notification in notifications:
 
@@ -224,14 +289,36 @@ class StreamCommands(commands.Cog):
                 LOG.warning(f"Notification for {user_data['display_name']} in channel "
                             f"{channel.guild.name}#{channel.name} has most likely been manually deleted, updating the "
                             f"database)")
-                await self.notification_db_driver.update('deleted_at', timestamp, message_id=notification.message_id)
-            else:
-                new_embed = message.embeds[0]
-                new_embed.color = models.OFFLINE_COLOR
+                notifications_to_update[NOTIFICATION_DELETED_COLUMNS].append((notification.message_id, timestamp))
+                continue
+            except errors.HTTPException:
+                LOG.exception(f"Cannot fetch the notification for {user_data['display_name']} in channel "
+                              f"{channel.guild.name}#{channel.name}")
+                continue
+
+            new_embed = message.embeds[0]
+            new_embed.color = models.OFFLINE_COLOR
 
+            try:
                 await message.edit(content="", embed=new_embed)
+            except errors.HTTPException:
+                LOG.exception(f"Cannot edit the notification for {user_data['display_name']} in channel "
+                              f"{channel.guild.name}#{channel.name}")
+                continue
+
+            notifications_to_update[NOTIFICATION_OFFLINE_COLUMNS].append((notification.message_id, timestamp))
 
-                await self.notification_db_driver.update('edited_at', timestamp, message_id=message.id)
+        return notifications_to_update
+
+    @staticmethod
+    async def _update_notifications(notification_db_driver, notifications_to_update):
+        """Write the notification updates, one statement per set of updated columns
+
+        :param notification_db_driver: the driver to use, e.g. bound to a transaction
+        :param notifications_to_update: dict of the updated columns to lists of (message_id, *values) tuples
+        """
+        for columns, values in notifications_to_update.items():
+            await notification_db_driver.bulk_update(['message_id'], columns, *values)
 
     async def update_subscriptions(self):
         """Renew subscriptions"""
@@ -272,25 +359,48 @@ class StreamCommands(commands.Cog):
         while True:
 
             timestamp = datetime.utcnow()
-            notifications = await self.notification_db_driver.list(deleted_at=None)
-
-            for notification in notifications:
-
-                if not notification.edited_at:
-                    continue
-
-                if (datetime.utcnow() - notification.edited_at).total_seconds() > OLD_NOTIFICATION_LIFESPAN:
-                    try:
-                        channel = self.bot.get_channel(notification.channel_id)
-                        message = await channel.fetch_message(notification.message_id)
-                        await message.delete()
-                    except errors.NotFound:
-                        LOG.warning(f"Notification for user '{notification.user_id}' in channel "
-                                    f"{notification.channel_id} has most likely been manually deleted")
-                    await self.notification_db_driver.update('deleted_at', timestamp,
-                                                             message_id=notification.message_id)
+
+            # The scan can run on the replica, the notifications are only deleted a day after they were edited
+            pages = self.notification_db_driver.iterate_batches('message_id', stale=True, deleted_at=None)
+            async for notifications in pages:
+                deleted_notifications = []
+
+                for notification in notifications:
+
+                    if not notification.edited_at:
+                        continue
+
+                    if (datetime.utcnow() - notification.edited_at).total_seconds() > OLD_NOTIFICATION_LIFESPAN:
+                        try:
+                            channel = self.bot.get_channel(notification.channel_id)
+                            message = await channel.fetch_message(notification.message_id)
+                            await message.delete()
+                        except errors.NotFound:
+                            LOG.warning(f"Notification for user '{notification.user_id}' in channel "
+                                        f"{notification.channel_id} has most likely been manually deleted")
+                        deleted_notifications.append((notification.message_id, timestamp))
+
+                await self.notification_db_driver.bulk_update(['message_id'], ['deleted_at'], *deleted_notifications)
             await asyncio.sleep(600)
 
+    async def purge_history(self):
+        """Archive the old streams and notifications, or drop them if `HISTORY_ARCHIVE` is disabled"""
+        LOG.debug("History retention task running...")
+        while True:
+            archive = config.get('HISTORY_ARCHIVE', True)
+            now = datetime.utcnow()
+
+            stream_retention = config.get('STREAM_HISTORY_RETENTION', STREAM_HISTORY_RETENTION)
+            count = await self.stream_db_driver.purge_history(now - timedelta(days=stream_retention), archive=archive)
+            LOG.debug(f"{count} streams older than {stream_retention} days {'archived' if archive else 'deleted'}")
+
+            notification_retention = config.get('NOTIFICATION_HISTORY_RETENTION', NOTIFICATION_HISTORY_RETENTION)
+            count = await self.notification_db_driver.purge_history(now - timedelta(days=notification_retention),
+                                                                    archive=archive)
+            LOG.debug(f"{count} notifications older than {notification_retention} days "
+                      f"{'archived' if archive else 'deleted'}")
+            await asyncio.sleep(HISTORY_RETENTION_INTERVAL)
+
     @commands.group()
     @commands.guild_only()
     async def stream(self, ctx):
@@ -303,12 +413,12 @@ class StreamCommands(commands.Cog):
     async def list(self, ctx):
         """Show the list of the current tracked streams"""
 
-        user_channels = await self.user_channel_db_driver.list()
+        user_channels = await self.user_channel_db_driver.list(stale=True)
 
-        users = await self.user_db_driver.list()
+        users = await self.user_db_driver.list(stale=True)
         users_by_id = {user.id: user for user in users}
 
-        channels = [self.bot.get_channel(channel.id) for channel in await self.channel_db_driver.list()]
+        channels = [self.bot.get_channel(channel.id) for channel in await self.channel_db_driver.list(stale=True)]
         channels_by_id = {channel.id: channel for channel in channels}
 
         users_by_channel = collections.defaultdict(list)
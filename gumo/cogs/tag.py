@@ -70,7 +70,7 @@ class TagCommands(commands.Cog):
     async def list_tag(self, ctx):
         """Return the list of available tags"""
         tags = [f'`{tag.code}`' if not re.match(emoji.EMOJI_REGEX, tag.code) else tag.code
-                for tag in await self.driver.list(guild_id=ctx.guild.id)]
+                for tag in await self.driver.list(guild_id=ctx.guild.id, stale=True)]
         result = "**Available tags**: " + ', '.join(sorted(tags))
         await ctx.send(result)
 
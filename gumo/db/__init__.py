@@ -1,3 +1,7 @@
+from .base import BaseModel, get_models
+from .migration import migrate
+from .pool import connect, create_pool
+from .storage import PostgresStorage, MemoryStorage
 from .admin import PrefixDBDriver, ExtensionDBDriver, AdminRoleDBDriver
 from .stream import ChannelDBDriver, UserDBDriver, UserChannelDBDriver, StreamDBDriver, NotificationDBDriver
 from .tags import TagDBDriver
@@ -28,19 +28,39 @@ class AdminRole(base.BaseModel):
     id = base.Column('bigint', nullable=False)
 
 
-class PrefixDBDriver(base.DBDriver):
+class GuildSettingDBDriver(base.DBDriver):
+    """Driver of a guild setting, the writes invalidate the settings cached for the written guilds"""
+
+    async def _invalidate(self, objs):
+        await self.bot.guild_settings.invalidate(*{obj.guild_id for obj in objs})
+        return objs
+
+    async def create(self, *values, columns=None, ensure=False):
+        return await self._invalidate(await super().create(*values, columns=columns, ensure=ensure))
+
+    async def delete(self, **filters):
+        return await self._invalidate(await super().delete(**filters))
+
+    async def update(self, column, value, **filters):
+        return await self._invalidate(await super().update(column, value, **filters))
+
+    async def bulk_update(self, key_columns, columns, *values):
+        return await self._invalidate(await super().bulk_update(key_columns, columns, *values))
+
+
+class PrefixDBDriver(GuildSettingDBDriver):
 
     def __init__(self, bot):
         super().__init__(bot, Prefix)
 
 
-class ExtensionDBDriver(base.DBDriver):
+class ExtensionDBDriver(GuildSettingDBDriver):
 
     def __init__(self, bot):
         super().__init__(bot, Extension)
 
 
-class AdminRoleDBDriver(base.DBDriver):
+class AdminRoleDBDriver(GuildSettingDBDriver):
 
     def __init__(self, bot):
         super().__init__(bot, AdminRole)
@@ -1,13 +1,13 @@
+import asyncio
+import copy
 import logging
 
-import asyncpg
-from asyncpg import exceptions
-
-from gumo import config
-
-
 LOG = logging.getLogger(__name__)
 
+ITERATION_BATCH_SIZE = 500
+PURGE_BATCH_SIZE = 1000
+PURGE_BATCH_DELAY = 0.1
+
 
 class Column:
 
@@ -32,14 +32,52 @@ class UniqueConstraint:
         self.column_names = list(column_names)
 
 
-class BaseModel:
+class Index:
+    """Index of a table, partial if a WHERE clause is given
+
+    :param column_names: the indexed columns, optionally followed by a sort order (e.g. 'started_at DESC')
+    :param where: the condition of the rows to index
+    :param name: the index name, built from the table and the column names by default
+    """
+
+    def __init__(self, *column_names, where=None, name=None):
+        self.column_names = list(column_names)
+        self.where = where
+        self.name = name
+
+    def get_name(self, table_name):
+        return self.name or f"{table_name}_{'_'.join(c.split()[0] for c in self.column_names)}_idx"
+
+    def get_definition(self, table_name):
+        definition = f"CREATE INDEX IF NOT EXISTS {self.get_name(table_name)} ON {table_name} " \
+            f"({', '.join(self.column_names)})"
+        return definition + bool(self.where) * f" WHERE {self.where}"
+
+
+class ModelMeta(type):
+    """Collect the column definitions of a model once, the instances only store the values in slots"""
+
+    def __new__(mcs, name, bases, namespace):
+        own_columns = {key: value for key, value in namespace.items() if isinstance(value, Column)}
+        for key in own_columns:
+            del namespace[key]
+        columns = {}
+        for base in bases:
+            columns.update(getattr(base, '__columns__', {}))
+        columns.update(own_columns)
+        namespace['__columns__'] = columns
+        namespace['__slots__'] = tuple(own_columns)
+        return super().__new__(mcs, name, bases, namespace)
+
+
+class BaseModel(metaclass=ModelMeta):
 
     __tablename__ = None
     __table_args__ = ()
 
     @classmethod
     def columns(cls):
-        return {name: definition for name, definition in vars(cls).items() if isinstance(definition, Column)}
+        return cls.__columns__
 
     @classmethod
     def constraint(cls):
@@ -50,114 +88,344 @@ class BaseModel:
         return [name for name, definition in cls.columns().items() if definition.primary_key]
 
     @classmethod
-    async def create(cls, pool):
-        try:
-            column_definitions = []
-            for column_name, column in cls.columns().items():
-                column_definition = f"{column_name} {column.type}"
-                column_definition += (not column.nullable) * " NOT NULL"
-                column_definition += column.primary_key * " PRIMARY KEY"
-                column_definition += (column.default is not None) * f" DEFAULT {column.default}"
-                column_definitions.append(column_definition)
-                if column.foreign_key:
-                    foreign_key = f"FOREIGN KEY ({column_name}) REFERENCES {column.foreign_key.model_name}" \
-                        f"({column.foreign_key.column_name})"
-                    column_definitions.append(foreign_key)
+    def relation_names(cls):
+        """Return the names of the table and of the declared indexes"""
+        return [cls.__tablename__] + [arg.get_name(cls.__tablename__) for arg in cls.__table_args__
+                                      if isinstance(arg, Index)]
 
-            for arg in cls.__table_args__:
-                if isinstance(arg, UniqueConstraint):
-                    constraint = f"CONSTRAINT {cls.__tablename__}_{'_'.join(arg.column_names)} " \
-                        f"UNIQUE ({', '.join(arg.column_names)})"
-                    column_definitions.append(constraint)
+    @classmethod
+    async def create(cls, pool):
+        """Create the table and its indexes if they do not exist, the errors are raised to roll back the migration"""
+        column_definitions = []
+        for column_name, column in cls.columns().items():
+            column_definition = f"{column_name} {column.type}"
+            column_definition += (not column.nullable) * " NOT NULL"
+            column_definition += column.primary_key * " PRIMARY KEY"
+            column_definition += (column.default is not None) * f" DEFAULT {column.default}"
+            column_definitions.append(column_definition)
+            if column.foreign_key:
+                foreign_key = f"FOREIGN KEY ({column_name}) REFERENCES {column.foreign_key.model_name}" \
+                    f"({column.foreign_key.column_name})"
+                column_definitions.append(foreign_key)
+
+        for arg in cls.__table_args__:
+            if isinstance(arg, UniqueConstraint):
+                constraint = f"CONSTRAINT {cls.__tablename__}_{'_'.join(arg.column_names)} " \
+                    f"UNIQUE ({', '.join(arg.column_names)})"
+                column_definitions.append(constraint)
+
+        query = f"CREATE TABLE IF NOT EXISTS {cls.__tablename__} ({', '.join(column_definitions)});"
+        await pool.execute(query)
+
+        for arg in cls.__table_args__:
+            if isinstance(arg, Index):
+                await pool.execute(arg.get_definition(cls.__tablename__))
 
-            query = f"CREATE TABLE IF NOT EXISTS {cls.__tablename__} ({', '.join(column_definitions)});"
-            await pool.execute(query)
-        except exceptions.PostgresError:
-            LOG.exception(f"Cannot create table {cls.__tablename__}")
+    @classmethod
+    def from_record(cls, record):
+        """Build an instance straight from a database record"""
+        obj = cls.__new__(cls)
+        for column in cls.__columns__:
+            setattr(obj, column, record.get(column))
+        return obj
 
     def __init__(self, **kwargs):
-        for column in self.columns():
+        for column in self.__columns__:
             setattr(self, column, kwargs.get(column))
 
     def __repr__(self):
-        formatted_attributes = [f'{column}={getattr(self, column)}' for column in self.columns()]
+        formatted_attributes = [f'{column}={getattr(self, column)}' for column in self.__columns__]
         return f"<{self.__class__.__name__} {' '.join(formatted_attributes)}>"
 
 
+def get_models(model=BaseModel):
+    """Return all the subclasses of a model, the parent models first"""
+    models = []
+    subclasses = model.__subclasses__()
+    while subclasses:
+        models.extend(subclasses)
+        subclasses = [subclass for model in subclasses for subclass in model.__subclasses__()]
+    return models
+
+
+class QueryCompiler:
+    """Build the SQL statements of a table.
+
+    The statements only depend on the shape of the call (the filtered columns and how they are compared), the values
+    are always bound as parameters. Each statement is built once and reused, so that the server can reuse its plan.
+    """
+
+    def __init__(self, table_name):
+        self.table_name = table_name
+        self._statements = {}
+
+    @staticmethod
+    def get_shape(filters):
+        """Return the shape of the filters and the values to bind
+
+        :param filters: dict of column name to value, None standing for NULL and a list for any of its values
+        :return: tuple of (column, operator), list of values
+        """
+        shape = []
+        values = []
+        for column, value in filters.items():
+            if value is None:
+                shape.append((column, 'null'))
+            elif isinstance(value, (list, tuple, set, frozenset)):
+                shape.append((column, 'any'))
+                values.append(list(value))
+            else:
+                shape.append((column, 'eq'))
+                values.append(value)
+        return tuple(shape), values
+
+    @staticmethod
+    def _get_conditions(shape, start=1):
+        conditions = []
+        index = start
+        for column, operator in shape:
+            if operator == 'null':
+                conditions.append(f"{column} IS NULL")
+            elif operator == 'any':
+                conditions.append(f"{column} = ANY(${index})")
+                index += 1
+            else:
+                conditions.append(f"{column} = ${index}")
+                index += 1
+        return f" WHERE {' AND '.join(conditions)}" if conditions else "", index
+
+    def _get_statement(self, key, build):
+        try:
+            return self._statements[key]
+        except KeyError:
+            statement = self._statements[key] = build()
+            LOG.debug(f"New statement compiled for {key}: {statement}")
+            return statement
+
+    def select(self, shape, order_by=None, desc=False, limit=False, after=False):
+        """Select rows, `after` adding a lower bound on the ordering column for keyset pagination"""
+        def build():
+            conditions, index = self._get_conditions(shape)
+            if after:
+                conditions += f" {'AND' if conditions else 'WHERE'} {order_by} > ${index}"
+                index += 1
+            query = f"SELECT * FROM {self.table_name}{conditions}"
+            query += bool(order_by) * (f" ORDER BY {order_by}" + desc * " DESC")
+            query += limit * f" LIMIT ${index}"
+            return query
+        return self._get_statement(('select', shape, order_by, desc, limit, after), build)
+
+    def count(self):
+        return self._get_statement(('count',), lambda: f"SELECT COUNT(*) FROM {self.table_name}")
+
+    def insert(self, columns, conflict_columns=None):
+        def build():
+            markers = ", ".join(f'${index}' for index in range(1, len(columns) + 1))
+            query = f"INSERT INTO {self.table_name} ({', '.join(columns)}) VALUES ({markers})"
+            query += bool(conflict_columns) * f" ON CONFLICT ({', '.join(conflict_columns or ())}) DO NOTHING"
+            return query + " RETURNING *"
+        return self._get_statement(('insert', columns, conflict_columns), build)
+
+    def insert_many(self, columns, types, conflict_columns=None):
+        """Insert several rows in a single statement, each column being bound as an array"""
+        def build():
+            arrays = ", ".join(f"${index}::{column_type}[]" for index, column_type in enumerate(types, 1))
+            query = f"INSERT INTO {self.table_name} ({', '.join(columns)}) SELECT * FROM unnest({arrays})"
+            query += bool(conflict_columns) * f" ON CONFLICT ({', '.join(conflict_columns or ())}) DO NOTHING"
+            return query + " RETURNING *"
+        return self._get_statement(('insert_many', columns, types, conflict_columns), build)
+
+    def update(self, columns, shape):
+        def build():
+            assignments = ", ".join(f"{column} = ${index}" for index, column in enumerate(columns, 1))
+            conditions, _ = self._get_conditions(shape, start=len(columns) + 1)
+            return f"UPDATE {self.table_name} SET {assignments}{conditions} RETURNING *"
+        return self._get_statement(('update', columns, shape), build)
+
+    def increment(self, column, shape):
+        def build():
+            conditions, _ = self._get_conditions(shape)
+            return f"UPDATE {self.table_name} SET {column} = {column} + 1{conditions} RETURNING *"
+        return self._get_statement(('increment', column, shape), build)
+
+    def update_many(self, key_columns, columns, types):
+        """Update several rows in a single statement, the keys and the new values being bound as arrays"""
+        def build():
+            arrays = ", ".join(f"${index}::{column_type}[]" for index, column_type in enumerate(types, 1))
+            assignments = ", ".join(f"{column} = v.{column}" for column in columns)
+            conditions = " AND ".join(f"{self.table_name}.{column} = v.{column}" for column in key_columns)
+            return f"UPDATE {self.table_name} SET {assignments} FROM unnest({arrays}) " \
+                f"AS v({', '.join(key_columns + columns)}) WHERE {conditions} RETURNING {self.table_name}.*"
+        return self._get_statement(('update_many', key_columns, columns, types), build)
+
+    def purge(self, column, columns, archive_table=None):
+        """Delete a batch of rows older than a date, moving them to an archive table if any"""
+        def build():
+            query = f"DELETE FROM {self.table_name} WHERE ctid IN (SELECT ctid FROM {self.table_name} " \
+                f"WHERE {column} < $1 LIMIT $2)"
+            if not archive_table:
+                return query
+            joined_columns = ", ".join(columns)
+            return f"WITH moved AS ({query} RETURNING *) " \
+                f"INSERT INTO {archive_table} ({joined_columns}) SELECT {joined_columns} FROM moved"
+        return self._get_statement(('purge', column, columns, archive_table), build)
+
+    def delete(self, shape):
+        def build():
+            conditions, _ = self._get_conditions(shape)
+            return f"DELETE FROM {self.table_name}{conditions} RETURNING *"
+        return self._get_statement(('delete', shape), build)
+
+    def delete_unreferenced(self, column, other_table, other_column):
+        """Delete the rows whose column value is not referenced by any row of another table"""
+        def build():
+            return f"DELETE FROM {self.table_name} WHERE {column} NOT IN " \
+                f"(SELECT {other_column} FROM {other_table}) RETURNING *"
+        return self._get_statement(('delete_unreferenced', column, other_table, other_column), build)
+
+
 class DBDriver:
+    """Access to the rows of a model, through the storage of the bot
+
+    The read operations take a `stale` flag: when a result lagging slightly behind the latest writes is acceptable,
+    they run on the replica of the bot if it has one. By default, they run on the primary so that a path always reads
+    its own writes. A driver bound to a storage (e.g. a transaction) always uses that storage.
+    """
 
     def __init__(self, bot, model):
         self.bot = bot
         self.model = model
         self.table_name = self.model.__tablename__
+        self._storage = None
+
+    def bind(self, storage):
+        """Return a copy of the driver running its operations on another storage, e.g. a transaction"""
+        driver = copy.copy(self)
+        driver._storage = storage
+        return driver
 
     async def init(self):
-        self.bot.pool = self.bot.pool or await asyncpg.create_pool(min_size=2, **config['DATABASE_CREDENTIALS'],
-                                                                   max_inactive_connection_lifetime=604800)
-        await self.model.create(self.bot.pool)
-        size = await self.count()
-        LOG.debug(f"Number of '{self.table_name}' found: {size}")
+        """Wait for the database schema to be migrated by the bot"""
+        await self.bot.schema_ready.wait()
+        LOG.debug(f"Driver of the table '{self.table_name}' ready")
+
+    @property
+    def table(self):
+        return (self._storage or self.bot.storage).get_table(self.model)
+
+    def _get_table(self, stale=False):
+        """Return the table the reads are run on"""
+        if stale and self._storage is None and self.bot.replica_storage:
+            return self.bot.replica_storage.get_table(self.model)
+        return self.table
 
     def _get_obj(self, record):
-        return self.model(**dict(record.items())) if record else None
+        return self.model.from_record(record) if record else None
 
-    @staticmethod
-    def _get_formatted_data(**filters):
-        formatted_filters = [f'{column} = ${index}' if filters[column] is not None else f'{column} IS NULL'
-                             for index, column in enumerate(filters, 1)]
-        filtered_values = [value for value in filters.values() if value is not None]
-        return formatted_filters, filtered_values
-
-    async def count(self):
-        query = f"SELECT COUNT(*) FROM {self.table_name}"
-        record = await self.bot.pool.fetchrow(query)
-        return record['count']
-
-    async def _list(self, order_by=None, desc=False, limit=0, **filters):
-        formatted_filters, filtered_values = self._get_formatted_data(**filters)
-        query = f"SELECT * FROM {self.table_name}"
-        query += bool(filters) * f" WHERE {' AND '.join(formatted_filters)}"
-        query += bool(order_by) * (f" ORDER BY {order_by}" + desc * " DESC")
-        query += bool(limit) * f" LIMIT {limit}"
-        return await self.bot.pool.fetch(query, *filtered_values)
-
-    async def list(self, order_by=None, desc=False, limit=0, **filters):
-        records = await self._list(order_by=order_by, desc=desc, limit=limit, **filters)
+    async def count(self, stale=False):
+        return await self._get_table(stale).count()
+
+    async def list(self, order_by=None, desc=False, limit=0, stale=False, **filters):
+        records = await self._get_table(stale).select(filters, order_by=order_by, desc=desc, limit=limit)
         return [self._get_obj(r) for r in records]
 
-    async def get(self, order_by=None, desc=False, **filters):
-        records = await self._list(order_by=order_by, desc=desc, limit=1, **filters)
+    async def get(self, order_by=None, desc=False, stale=False, **filters):
+        records = await self._get_table(stale).select(filters, order_by=order_by, desc=desc, limit=1)
         return self._get_obj(records[0]) if records else None
 
+    async def iterate_batches(self, key, batch_size=ITERATION_BATCH_SIZE, stale=False, **filters):
+        """Iterate over the rows by batches, fetching one page at a time
+
+        The pages are ordered by a key column and each one starts after the last key of the previous one, so the key
+        must be unique and should be indexed. No connection is held between two pages.
+
+        :param key: the column used to paginate
+        :param batch_size: the number of rows fetched per page
+        :param stale: whether the pages can be read from the replica
+        :param filters: dict of column name to value, None standing for NULL
+        :return: async iterator of lists of objects
+        """
+        table = self._get_table(stale)
+        last_key = None
+        while True:
+            records = await table.select(filters, order_by=key, limit=batch_size, after=last_key)
+            if records:
+                yield [self._get_obj(r) for r in records]
+            if len(records) < batch_size:
+                return
+            last_key = records[-1][key]
+
+    async def iterate(self, key, batch_size=ITERATION_BATCH_SIZE, stale=False, **filters):
+        """Iterate over the rows one by one, see `iterate_batches`"""
+        async for batch in self.iterate_batches(key, batch_size=batch_size, stale=stale, **filters):
+            for obj in batch:
+                yield obj
+
     async def create(self, *values, columns=None, ensure=False):
-        columns = columns or self.model.columns()
-        joined_constraint_columns = ", ".join(self.model.constraint())
-        joined_columns = ", ".join(columns)
-        joined_markers = ", ".join(f'${index}' for index in range(1, len(columns) + 1))
-        query = f"INSERT INTO {self.table_name} ({joined_columns}) VALUES ({joined_markers}) "
-        query += ensure * f"ON CONFLICT ({joined_constraint_columns}) DO NOTHING"
-        query += " RETURNING *"
-        async with self.bot.pool.acquire() as connection:
-            records = [await connection.fetchrow(query, *value) for value in values]
-            return [self._get_obj(r) for r in records if r]
+        """Insert rows in a single statement
+
+        :param values: the rows, as sequences of values
+        :param columns: the column names, all the columns by default
+        :param ensure: whether the rows conflicting with an existing one are skipped
+        :return: the created objects
+        """
+        if not values:
+            return []
+        columns = tuple(columns or self.model.columns())
+        conflict_columns = tuple(self.model.constraint()) if ensure else None
+        records = await self.table.insert(columns, values, conflict_columns)
+        return [self._get_obj(r) for r in records if r]
+
+    async def copy(self, *values, columns=None):
+        """Load a large number of rows with COPY, without conflict handling
+
+        :param values: the rows, as sequences of values
+        :param columns: the column names, all the columns by default
+        """
+        await self.table.copy(tuple(columns or self.model.columns()), values)
+
+    async def purge(self, column, before, archive_model=None, batch_size=PURGE_BATCH_SIZE,
+                    batch_delay=PURGE_BATCH_DELAY):
+        """Delete the rows older than a date, moving them to an archive table if any
+
+        The rows are processed in small batches, each statement being its own short transaction.
+
+        :param column: the date column
+        :param before: the rows whose date is strictly older are purged
+        :param archive_model: the model of the archive table, with the same columns
+        :param batch_size: the number of rows purged per statement
+        :param batch_delay: the pause between two batches (s)
+        :return: the number of rows purged
+        """
+        total = 0
+        while True:
+            count = await self.table.purge(column, before, archive_model, batch_size)
+            total += count
+            if count < batch_size:
+                return total
+            await asyncio.sleep(batch_delay)
 
     async def delete(self, **filters):
         if not filters:
             raise RuntimeError("Cannot delete using empty filters")
-        formatted_filters, filtered_values = self._get_formatted_data(**filters)
-        query = f"DELETE FROM {self.table_name}"
-        query += bool(filters) * f" WHERE {' AND '.join(formatted_filters)}"
-        query += " RETURNING *"
-        records = await self.bot.pool.fetch(query, *filtered_values)
+        records = await self.table.delete(filters)
         return [self._get_obj(r) for r in records if r]
 
     async def update(self, column, value, **filters):
         if not filters:
             raise RuntimeError("Cannot update using empty filters")
-        formatted_filters, filtered_values = self._get_formatted_data(**filters)
-        value = f"'{value}'" if value is not None else "NULL"
-        query = f"UPDATE {self.table_name} SET {column} = {value}"
-        query += bool(filters) * f" WHERE {' AND '.join(formatted_filters)}"
-        query += " RETURNING *"
-        records = await self.bot.pool.fetch(query, *filtered_values)
+        records = await self.table.update({column: value}, filters)
+        return [self._get_obj(r) for r in records if r]
+
+    async def bulk_update(self, key_columns, columns, *values):
+        """Update several rows in a single statement, each row getting its own values
+
+        :param key_columns: the columns identifying the rows to update
+        :param columns: the columns to update
+        :param values: the rows, as sequences of the key values followed by the new values
+        :return: the updated objects
+        """
+        if not values:
+            return []
+        records = await self.table.bulk_update(tuple(key_columns), tuple(columns), values)
         return [self._get_obj(r) for r in records if r]
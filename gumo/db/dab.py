@@ -8,6 +8,10 @@ LOG = logging.getLogger(__name__)
 class Dab(base.BaseModel):
 
     __tablename__ = "dabs"
+    __table_args__ = (
+        base.Index("guild_id", "author_id", "created_at"),
+        base.Index("guild_id", "target_id"),
+    )
 
     guild_id = base.Column('bigint', nullable=False)
     author_id = base.Column('bigint', nullable=False)
@@ -33,17 +37,15 @@ class DabDBDriver(base.DBDriver):
         for target in targets:
             values.append((guild_id, author.id, str(author), target.id, str(target), amount, created_at))
 
-        joined_columns = ", ".join(columns)
-        joined_markers = ", ".join(f'${index}' for index in range(1, len(columns) + 1))
-        q = f"INSERT INTO {self.table_name} ({joined_columns}) VALUES ({joined_markers}) RETURNING *"
-        await self.bot.pool.executemany(q, values)
+        await self.create(*values, columns=columns)
 
     async def reroll_dabs(self, guild_id, author, new_amount, created_at, rerolled_at):
-        q = f"UPDATE {self.table_name} SET rerolled_amount = $1, rerolled_at = $2 " \
-            f"WHERE guild_id = $3 AND author_id = $4 AND created_at = $5"
-        await self.bot.pool.execute(q, new_amount, rerolled_at,  guild_id, author.id, created_at)
-
-    async def get_user_data(self, guild_id, author_id):
-        return await self.bot.pool.fetch("SELECT created_at, author_id, target_id, amount, rerolled_amount "
-                                         "FROM dabs WHERE guild_id = $1 AND (author_id = $2 OR target_id = $2)",
-                                         guild_id, author_id)
+        await self.table.update({'rerolled_amount': new_amount, 'rerolled_at': rerolled_at},
+                                {'guild_id': guild_id, 'author_id': author.id, 'created_at': created_at})
+
+    async def get_user_data(self, guild_id, author_id, stale=False):
+        """Return the dabs of a member and the dabs on them, each query using its own index"""
+        table = self._get_table(stale)
+        dabs = await table.select({'guild_id': guild_id, 'author_id': author_id})
+        dabs_on_member = await table.select({'guild_id': guild_id, 'target_id': author_id})
+        return dabs + [r for r in dabs_on_member if r['author_id'] != author_id]
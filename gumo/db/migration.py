@@ -0,0 +1,123 @@
+import logging
+import os
+import re
+
+from asyncpg import exceptions
+
+from gumo import utils
+
+LOG = logging.getLogger(__name__)
+
+MIGRATION_FOLDER = os.path.join(utils.get_project_dir(), 'migration')
+MIGRATION_FILENAME_REGEX = re.compile(r'^(?P<version>[0-9]+)_.+\.sql$')
+
+SCHEMA_VERSION_TABLE = "schema_versions"
+
+# The migrations up to this version were applied by hand before the runner existed
+BASELINE_VERSION = 1
+
+MAX_IDENTIFIER_LENGTH = 63
+
+# Serializes the migrations of several bot instances sharing a database
+MIGRATION_LOCK_ID = 0x67756d6f
+
+
+def get_migrations(folder=MIGRATION_FOLDER):
+    """Return the migration scripts of a folder
+
+    :param folder: the folder containing the '<version>_<description>.sql' files
+    :return: sorted list of (version, path)
+    """
+    migrations = []
+    for filename in os.listdir(folder):
+        match = MIGRATION_FILENAME_REGEX.match(filename)
+        if match:
+            migrations.append((int(match.group('version')), os.path.join(folder, filename)))
+    return sorted(migrations)
+
+
+async def get_version(connection):
+    """Return the schema version of the database, None if it is not versioned yet"""
+    try:
+        return await connection.fetchval(f"SELECT coalesce(max(version), 0) FROM {SCHEMA_VERSION_TABLE}")
+    except exceptions.UndefinedTableError:
+        return None
+
+
+async def get_missing_relations(connection, models):
+    """Return the names of the tables and indexes declared by the models that do not exist in the database"""
+    # The names longer than the identifier limit are truncated by PostgreSQL
+    names = {name[:MAX_IDENTIFIER_LENGTH] for model in models for name in model.relation_names()}
+    existing_names = await connection.fetch("SELECT relname FROM pg_class "
+                                            "WHERE relnamespace = current_schema()::regnamespace "
+                                            "AND relname = ANY($1)", list(names))
+    return names - {record['relname'] for record in existing_names}
+
+
+async def migrate(pool, models, folder=MIGRATION_FOLDER):
+    """Bring the database schema up to date
+
+    When the schema version matches the latest migration and every table and index declared by the models exists,
+    this costs two queries. Otherwise, the pending migration scripts are applied in order, the missing tables and
+    indexes of the models are created, and the new version is recorded, all in one transaction.
+
+    A database without any of the model tables is created from the models directly, a database without a schema
+    version but with tables is assumed to be at the baseline version.
+
+    :param pool: the connection pool
+    :param models: the model classes, tables referenced by a foreign key first
+    :param folder: the folder containing the migration scripts
+    :return: the schema version
+    """
+    migrations = get_migrations(folder)
+    latest_version = migrations[-1][0] if migrations else 0
+
+    async with pool.acquire() as connection:
+        version = await get_version(connection)
+        if version == latest_version:
+            missing_relations = await get_missing_relations(connection, models)
+            if not missing_relations:
+                LOG.debug(f"Database schema up to date (version {version})")
+                return version
+            LOG.info(f"Creating the missing tables and indexes: {', '.join(sorted(missing_relations))}")
+
+        async with connection.transaction():
+            await connection.execute("SELECT pg_advisory_xact_lock($1)", MIGRATION_LOCK_ID)
+
+            # Another instance may have migrated the database in the meantime, a failed query would abort the
+            # transaction so the version table existence is checked first
+            versioned = await connection.fetchval("SELECT to_regclass($1) IS NOT NULL", SCHEMA_VERSION_TABLE)
+            version = await get_version(connection) if versioned else None
+            if version is None:
+                await connection.execute(f"CREATE TABLE {SCHEMA_VERSION_TABLE} (version integer PRIMARY KEY, "
+                                         f"applied_at timestamp NOT NULL DEFAULT (now() at time zone 'utc'))")
+                table_names = [model.__tablename__ for model in models]
+                existing_tables = await connection.fetchval(
+                    "SELECT count(*) FROM information_schema.tables "
+                    "WHERE table_schema = current_schema() AND table_name = ANY($1)", table_names)
+                version = BASELINE_VERSION if existing_tables else latest_version
+                LOG.info(f"Unversioned database schema, starting from version {version}")
+
+            if version > latest_version:
+                LOG.warning(f"The database schema (version {version}) is newer than the latest migration "
+                            f"(version {latest_version})")
+                return version
+
+            for migration_version, path in migrations:
+                if migration_version <= version:
+                    continue
+                LOG.info(f"Applying the migration {os.path.basename(path)}")
+                with open(path, encoding='utf-8') as f:
+                    await connection.execute(f.read())
+
+            for model in models:
+                try:
+                    await model.create(connection)
+                except exceptions.PostgresError:
+                    LOG.error(f"Cannot create the table {model.__tablename__}, the migration is rolled back")
+                    raise
+
+            await connection.execute(f"INSERT INTO {SCHEMA_VERSION_TABLE} (version) VALUES ($1) "
+                                     f"ON CONFLICT DO NOTHING", latest_version)
+            LOG.info(f"Database schema migrated from version {version} to version {latest_version}")
+            return latest_version
@@ -0,0 +1,232 @@
+import asyncio
+import contextlib
+import logging
+import time
+
+import asyncpg
+
+from gumo import config
+from gumo.codec import codec
+from gumo import metrics
+
+LOG = logging.getLogger(__name__)
+
+DEFAULT_POOL_MIN_SIZE = 2
+DEFAULT_POOL_MAX_SIZE = 10
+DEFAULT_STATEMENT_CACHE_SIZE = 100
+DEFAULT_COMMAND_TIMEOUT = 60
+MAX_INACTIVE_CONNECTION_LIFETIME = 604800
+
+# Queries slower than this (in seconds) are logged, see the `DATABASE_SLOW_QUERY_THRESHOLD` config key
+DEFAULT_SLOW_QUERY_THRESHOLD = 0.5
+
+
+class PoolStats:
+
+    def __init__(self):
+        self.acquire_wait = metrics.Histogram()
+        self.acquired = 0
+        self.timeouts = 0
+        self.waiting = 0
+        self.in_use = 0
+        self.max_in_use = 0
+
+
+class QueryStats:
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.rows = 0
+        self.latency = metrics.Histogram()
+
+
+QUERY_METRICS = metrics.Registry(QueryStats)
+
+
+def get_parameter_shape(args):
+    """Describe the bound parameters without their values, e.g. 'int, NULL, str[3]'"""
+    shapes = []
+    for arg in args:
+        if arg is None:
+            shapes.append("NULL")
+        elif isinstance(arg, (list, tuple)):
+            shapes.append(f"{type(arg[0]).__name__ if arg else ''}[{len(arg)}]")
+        else:
+            shapes.append(type(arg).__name__)
+    return ", ".join(shapes)
+
+
+async def init_connection(connection):
+    """Set up a new connection of the pool"""
+    for type_name in ('json', 'jsonb'):
+        await connection.set_type_codec(type_name, encoder=codec.dumps, decoder=codec.loads, schema='pg_catalog')
+
+
+async def _run_query(connection, key, args, method, *method_args, **method_kwargs):
+    """Run a connection method, timing it under the statement key"""
+    stats = QUERY_METRICS[key]
+    started_at = time.perf_counter()
+    try:
+        result = await getattr(connection, method)(*method_args, **method_kwargs)
+    except Exception:
+        stats.errors += 1
+        raise
+    finally:
+        duration = time.perf_counter() - started_at
+        stats.calls += 1
+        stats.latency.observe(duration)
+        if duration >= config.get('DATABASE_SLOW_QUERY_THRESHOLD', DEFAULT_SLOW_QUERY_THRESHOLD):
+            LOG.warning(f"Slow query ({duration:.3f}s): {key} | parameters: {get_parameter_shape(args)}")
+    if isinstance(result, list):
+        stats.rows += len(result)
+    elif result is not None:
+        stats.rows += 1
+    return result
+
+
+class Transaction:
+    """Query shortcuts of a connection in a transaction, timed like the pool ones"""
+
+    def __init__(self, connection):
+        self._connection = connection
+
+    async def execute(self, query, *args, timeout=None):
+        return await _run_query(self._connection, query, args, 'execute', query, *args, timeout=timeout)
+
+    async def executemany(self, command, args, timeout=None):
+        return await _run_query(self._connection, command, [args], 'executemany', command, args, timeout=timeout)
+
+    async def fetch(self, query, *args, timeout=None):
+        return await _run_query(self._connection, query, args, 'fetch', query, *args, timeout=timeout)
+
+    async def fetchrow(self, query, *args, timeout=None):
+        return await _run_query(self._connection, query, args, 'fetchrow', query, *args, timeout=timeout)
+
+    async def fetchval(self, query, *args, column=0, timeout=None):
+        return await _run_query(self._connection, query, args, 'fetchval', query, *args, column=column,
+                                timeout=timeout)
+
+    async def copy_records_to_table(self, table_name, *, records, columns=None, timeout=None):
+        records = list(records)
+        return await _run_query(self._connection, f"COPY {table_name}", [records], 'copy_records_to_table',
+                                table_name, records=records, columns=columns, timeout=timeout)
+
+
+class _AcquireContext:
+
+    def __init__(self, pool, timeout):
+        self._pool = pool
+        self._timeout = timeout
+        self._connection = None
+
+    async def __aenter__(self):
+        self._connection = await self._pool._acquire(self._timeout)
+        return self._connection
+
+    async def __aexit__(self, *exc_info):
+        await self._pool.release(self._connection)
+
+
+class Pool:
+    """Wrapper around an asyncpg pool keeping track of the connection acquisitions.
+
+    The query shortcuts acquire their connection through the wrapper, so that every query is accounted for, and
+    record the statistics of each statement in `QUERY_METRICS`.
+    """
+
+    def __init__(self, pool, min_size, max_size):
+        self._pool = pool
+        self.min_size = min_size
+        self.max_size = max_size
+        self.stats = PoolStats()
+
+    async def _acquire(self, timeout=None):
+        self.stats.waiting += 1
+        started_at = time.perf_counter()
+        try:
+            connection = await self._pool.acquire(timeout=timeout)
+        except asyncio.TimeoutError:
+            self.stats.timeouts += 1
+            raise
+        finally:
+            self.stats.waiting -= 1
+            self.stats.acquire_wait.observe(time.perf_counter() - started_at)
+        self.stats.acquired += 1
+        self.stats.in_use += 1
+        self.stats.max_in_use = max(self.stats.max_in_use, self.stats.in_use)
+        return connection
+
+    def acquire(self, timeout=None):
+        """Acquire a connection, to be used as an async context manager"""
+        return _AcquireContext(self, timeout)
+
+    async def release(self, connection):
+        self.stats.in_use -= 1
+        await self._pool.release(connection)
+
+    async def _query(self, key, args, method, *method_args, **method_kwargs):
+        """Run a connection method, timing it under the statement key (the wait for a connection excluded)"""
+        async with self.acquire() as connection:
+            return await _run_query(connection, key, args, method, *method_args, **method_kwargs)
+
+    @contextlib.asynccontextmanager
+    async def transaction(self):
+        """Run the queries of the block in a single transaction, committed if the block does not raise"""
+        async with self.acquire() as connection:
+            async with connection.transaction():
+                yield Transaction(connection)
+
+    async def execute(self, query, *args, timeout=None):
+        return await self._query(query, args, 'execute', query, *args, timeout=timeout)
+
+    async def executemany(self, command, args, timeout=None):
+        return await self._query(command, [args], 'executemany', command, args, timeout=timeout)
+
+    async def fetch(self, query, *args, timeout=None):
+        return await self._query(query, args, 'fetch', query, *args, timeout=timeout)
+
+    async def fetchrow(self, query, *args, timeout=None):
+        return await self._query(query, args, 'fetchrow', query, *args, timeout=timeout)
+
+    async def fetchval(self, query, *args, column=0, timeout=None):
+        return await self._query(query, args, 'fetchval', query, *args, column=column, timeout=timeout)
+
+    async def copy_records_to_table(self, table_name, *, records, columns=None, timeout=None):
+        records = list(records)
+        return await self._query(f"COPY {table_name}", [records], 'copy_records_to_table', table_name,
+                                 records=records, columns=columns, timeout=timeout)
+
+    async def close(self):
+        await self._pool.close()
+
+
+async def create_pool(credentials_key='DATABASE_CREDENTIALS'):
+    """Create a connection pool of the bot
+
+    The credentials are read from the `DATABASE_CREDENTIALS` config key (or `DATABASE_REPLICA_CREDENTIALS` for the
+    read replica), the pool can be tuned with the `DATABASE_POOL_MIN_SIZE`, `DATABASE_POOL_MAX_SIZE`,
+    `DATABASE_STATEMENT_CACHE_SIZE` and `DATABASE_COMMAND_TIMEOUT` ones.
+
+    :param credentials_key: the config key of the connection arguments
+    """
+    min_size = config.get('DATABASE_POOL_MIN_SIZE', DEFAULT_POOL_MIN_SIZE)
+    max_size = config.get('DATABASE_POOL_MAX_SIZE', DEFAULT_POOL_MAX_SIZE)
+    pool = await asyncpg.create_pool(min_size=min_size, max_size=max_size, init=init_connection,
+                                     statement_cache_size=config.get('DATABASE_STATEMENT_CACHE_SIZE',
+                                                                     DEFAULT_STATEMENT_CACHE_SIZE),
+                                     command_timeout=config.get('DATABASE_COMMAND_TIMEOUT', DEFAULT_COMMAND_TIMEOUT),
+                                     max_inactive_connection_lifetime=MAX_INACTIVE_CONNECTION_LIFETIME,
+                                     **config[credentials_key])
+    LOG.debug(f"Database pool created from '{credentials_key}' ({min_size} to {max_size} connections)")
+    return Pool(pool, min_size, max_size)
+
+
+async def connect(credentials_key='DATABASE_CREDENTIALS'):
+    """Open a connection outside of the pools, e.g. to listen to notifications
+
+    :param credentials_key: the config key of the connection arguments
+    """
+    connection = await asyncpg.connect(**config[credentials_key])
+    await init_connection(connection)
+    return connection
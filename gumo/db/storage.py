@@ -0,0 +1,276 @@
+"""Storage backends of the database drivers
+
+Each backend gives access to one table object per model, exposing the operations the drivers are built on. The
+PostgreSQL backend is the one the bot runs with, the in-memory one lets the cogs run without a database server (e.g.
+to benchmark them) with the same results for the operations the drivers use.
+"""
+import contextlib
+import datetime
+import logging
+
+import asyncpg
+
+from gumo.db import base
+
+LOG = logging.getLogger(__name__)
+
+
+class PostgresTable:
+
+    def __init__(self, pool, model, compiler=None):
+        self.pool = pool
+        self.model = model
+        self.compiler = compiler or base.QueryCompiler(model.__tablename__)
+
+    async def count(self):
+        return await self.pool.fetchval(self.compiler.count())
+
+    async def select(self, filters, order_by=None, desc=False, limit=0, after=None):
+        shape, values = self.compiler.get_shape(filters)
+        query = self.compiler.select(shape, order_by=order_by, desc=desc, limit=bool(limit), after=after is not None)
+        if after is not None:
+            values.append(after)
+        if limit:
+            values.append(limit)
+        return await self.pool.fetch(query, *values)
+
+    async def insert(self, columns, rows, conflict_columns=None):
+        if len(rows) == 1:
+            return await self.pool.fetch(self.compiler.insert(columns, conflict_columns), *rows[0])
+        definitions = self.model.columns()
+        types = tuple(definitions[column].type for column in columns)
+        arrays = [list(array) for array in zip(*rows)]
+        return await self.pool.fetch(self.compiler.insert_many(columns, types, conflict_columns), *arrays)
+
+    async def copy(self, columns, rows):
+        await self.pool.copy_records_to_table(self.model.__tablename__, records=rows, columns=list(columns))
+
+    async def update(self, values, filters):
+        shape, filter_values = self.compiler.get_shape(filters)
+        return await self.pool.fetch(self.compiler.update(tuple(values), shape), *values.values(), *filter_values)
+
+    async def increment(self, column, filters):
+        shape, values = self.compiler.get_shape(filters)
+        return await self.pool.fetch(self.compiler.increment(column, shape), *values)
+
+    async def bulk_update(self, key_columns, columns, rows):
+        definitions = self.model.columns()
+        types = tuple(definitions[column].type for column in key_columns + columns)
+        arrays = [list(array) for array in zip(*rows)]
+        return await self.pool.fetch(self.compiler.update_many(key_columns, columns, types), *arrays)
+
+    async def delete(self, filters):
+        shape, values = self.compiler.get_shape(filters)
+        return await self.pool.fetch(self.compiler.delete(shape), *values)
+
+    async def delete_unreferenced(self, column, model, referencing_column):
+        return await self.pool.fetch(self.compiler.delete_unreferenced(column, model.__tablename__,
+                                                                       referencing_column))
+
+    async def purge(self, column, before, archive_model, batch_size):
+        archive_table = archive_model.__tablename__ if archive_model else None
+        query = self.compiler.purge(column, tuple(self.model.columns()), archive_table)
+        status = await self.pool.execute(query, before, batch_size)
+        return int(status.rsplit(" ", 1)[-1])
+
+
+class PostgresStorage:
+
+    def __init__(self, pool, parent=None):
+        self.pool = pool
+        self._parent = parent
+        self._tables = {}
+
+    def get_table(self, model):
+        try:
+            return self._tables[model]
+        except KeyError:
+            # The tables of a transaction reuse the statements compiled by the tables of the pool
+            compiler = self._parent.get_table(model).compiler if self._parent else None
+            table = self._tables[model] = PostgresTable(self.pool, model, compiler)
+            return table
+
+    @contextlib.asynccontextmanager
+    async def transaction(self):
+        """Return a storage running its operations in a single transaction"""
+        async with self.pool.transaction() as transaction:
+            yield PostgresStorage(transaction, parent=self)
+
+
+def _get_default(column):
+    """Evaluate the SQL default of a column, only the constants and the current date are supported"""
+    if column.default is None or isinstance(column.default, (int, float)):
+        return column.default
+    if "now()" in column.default:
+        return datetime.datetime.utcnow()
+    return None
+
+
+class MemoryTable:
+    """Rows of a table kept in a list, behaving like the statements of the PostgreSQL backend
+
+    The unique constraint of the model is enforced and the `citext` columns are compared case-insensitively. The
+    foreign keys and the NOT NULL constraints are not checked.
+    """
+
+    def __init__(self, storage, model):
+        self.storage = storage
+        self.model = model
+        self.columns = model.columns()
+        self.rows = []
+        self.constraint = tuple(model.constraint())
+        self._unique_keys = set()
+        self._case_insensitive = {name for name, column in self.columns.items() if column.type == 'citext'}
+
+    def _normalize(self, column, value):
+        if value is not None and column in self._case_insensitive:
+            return value.casefold()
+        return value
+
+    def _get_unique_key(self, row):
+        return tuple(self._normalize(column, row[column]) for column in self.constraint) if self.constraint else None
+
+    def _get_predicate(self, filters):
+        conditions = []
+        for column, value in filters.items():
+            if value is None:
+                conditions.append((column, None))
+            elif isinstance(value, (list, tuple, set, frozenset)):
+                conditions.append((column, {self._normalize(column, v) for v in value}))
+            else:
+                conditions.append((column, {self._normalize(column, value)}))
+
+        def predicate(row):
+            for column, values in conditions:
+                row_value = self._normalize(column, row[column])
+                if values is None:
+                    if row_value is not None:
+                        return False
+                elif row_value is None or row_value not in values:
+                    return False
+            return True
+        return predicate
+
+    def _add(self, row, skip_conflicts):
+        key = self._get_unique_key(row)
+        if key is not None:
+            if key in self._unique_keys:
+                if skip_conflicts:
+                    return False
+                raise asyncpg.UniqueViolationError(f"duplicate key value violates unique constraint on "
+                                                   f"{self.model.__tablename__} {self.constraint}")
+            self._unique_keys.add(key)
+        self.rows.append(row)
+        return True
+
+    def _remove(self, rows):
+        removed = {id(row) for row in rows}
+        self.rows = [row for row in self.rows if id(row) not in removed]
+        for row in rows:
+            self._unique_keys.discard(self._get_unique_key(row))
+
+    def _set(self, row, values):
+        old_key = self._get_unique_key(row)
+        new_row = {**row, **values}
+        new_key = self._get_unique_key(new_row)
+        if new_key != old_key:
+            if new_key in self._unique_keys:
+                raise asyncpg.UniqueViolationError(f"duplicate key value violates unique constraint on "
+                                                   f"{self.model.__tablename__} {self.constraint}")
+            self._unique_keys.discard(old_key)
+            self._unique_keys.add(new_key)
+        row.update(values)
+
+    async def count(self):
+        return len(self.rows)
+
+    async def select(self, filters, order_by=None, desc=False, limit=0, after=None):
+        predicate = self._get_predicate(filters)
+        rows = [row for row in self.rows if predicate(row)]
+        if after is not None:
+            rows = [row for row in rows if row[order_by] is not None and row[order_by] > after]
+        if order_by:
+            # NULL values come last in ascending order and first in descending order, as with PostgreSQL
+            rows.sort(key=lambda row: (row[order_by] is None, row[order_by]), reverse=desc)
+        if limit:
+            rows = rows[:limit]
+        return [dict(row) for row in rows]
+
+    async def insert(self, columns, rows, conflict_columns=None):
+        records = []
+        for values in rows:
+            row = {name: _get_default(column) for name, column in self.columns.items()}
+            row.update(zip(columns, values))
+            if self._add(row, skip_conflicts=bool(conflict_columns)):
+                records.append(dict(row))
+        return records
+
+    async def copy(self, columns, rows):
+        await self.insert(columns, rows)
+
+    async def update(self, values, filters):
+        predicate = self._get_predicate(filters)
+        records = []
+        for row in self.rows:
+            if predicate(row):
+                self._set(row, values)
+                records.append(dict(row))
+        return records
+
+    async def increment(self, column, filters):
+        predicate = self._get_predicate(filters)
+        records = []
+        for row in self.rows:
+            if predicate(row):
+                self._set(row, {column: row[column] + 1})
+                records.append(dict(row))
+        return records
+
+    async def bulk_update(self, key_columns, columns, rows):
+        values_by_key = {tuple(values[:len(key_columns)]): dict(zip(columns, values[len(key_columns):]))
+                         for values in rows}
+        records = []
+        for row in self.rows:
+            values = values_by_key.get(tuple(row[column] for column in key_columns))
+            if values is not None:
+                self._set(row, values)
+                records.append(dict(row))
+        return records
+
+    async def delete(self, filters):
+        predicate = self._get_predicate(filters)
+        deleted = [row for row in self.rows if predicate(row)]
+        self._remove(deleted)
+        return [dict(row) for row in deleted]
+
+    async def delete_unreferenced(self, column, model, referencing_column):
+        referenced = {row[referencing_column] for row in self.storage.get_table(model).rows}
+        deleted = [row for row in self.rows if row[column] not in referenced]
+        self._remove(deleted)
+        return [dict(row) for row in deleted]
+
+    async def purge(self, column, before, archive_model, batch_size):
+        purged = [row for row in self.rows if row[column] is not None and row[column] < before][:batch_size]
+        self._remove(purged)
+        if archive_model:
+            columns = tuple(self.columns)
+            await self.storage.get_table(archive_model).insert(columns, [[row[c] for c in columns] for row in purged])
+        return len(purged)
+
+
+class MemoryStorage:
+
+    def __init__(self):
+        self._tables = {}
+
+    def get_table(self, model):
+        try:
+            return self._tables[model]
+        except KeyError:
+            table = self._tables[model] = MemoryTable(self, model)
+            return table
+
+    @contextlib.asynccontextmanager
+    async def transaction(self):
+        """The operations are applied immediately, they are not rolled back if the block raises"""
+        yield self
@@ -20,29 +20,37 @@ class User(base.BaseModel):
 
     __tablename__ = "users"
 
-    id = base.Column('varchar(255)', primary_key=True)
+    id = base.Column('bigint', primary_key=True)
     login = base.Column('varchar(255)', nullable=False)
 
 
 class UserChannel(base.BaseModel):
 
     __tablename__ = "user_channels"
-    __table_args__ = base.UniqueConstraint("user_id", "channel_id"),
+    __table_args__ = (
+        base.UniqueConstraint("user_id", "channel_id"),
+        base.Index("channel_id"),
+    )
 
     channel_id = base.Column('bigint', base.ForeignKey("channels", "id"), nullable=False)
-    user_id = base.Column('varchar(255)', base.ForeignKey("users", "id"), nullable=False)
+    user_id = base.Column('bigint', base.ForeignKey("users", "id"), nullable=False)
     tags = base.Column('varchar(255)')
 
 
 class Stream(base.BaseModel):
 
     __tablename__ = "streams"
-    __table_args__ = base.UniqueConstraint("id", "started_at"),
-
-    id = base.Column('varchar(255)', nullable=False)
+    __table_args__ = (
+        base.UniqueConstraint("id", "started_at"),
+        base.Index("user_id", "started_at DESC"),
+        base.Index("user_id", where="ended_at IS NULL", name="streams_user_id_active_idx"),
+        base.Index("ended_at", where="ended_at IS NOT NULL"),
+    )
+
+    id = base.Column('bigint', nullable=False)
     type = base.Column('varchar(255)', nullable=False)  # 'live' or 'vodcast'
-    user_id = base.Column('varchar(255)', nullable=False)
-    game_id = base.Column('varchar(255)')
+    user_id = base.Column('bigint', nullable=False)
+    game_id = base.Column('bigint')
     started_at = base.Column('timestamp')
     ended_at = base.Column('timestamp')
 
@@ -50,26 +58,43 @@ class Stream(base.BaseModel):
 class Notification(base.BaseModel):
 
     __tablename__ = "notifications"
-    __table_args__ = base.UniqueConstraint("stream_id", "message_id"),
+    __table_args__ = (
+        base.UniqueConstraint("stream_id", "message_id"),
+        base.Index("stream_id", where="deleted_at IS NULL", name="notifications_stream_id_active_idx"),
+        base.Index("user_id", where="edited_at IS NULL AND deleted_at IS NULL",
+                   name="notifications_user_id_active_idx"),
+        base.Index("edited_at", where="deleted_at IS NULL", name="notifications_edited_at_active_idx"),
+        base.Index("deleted_at", where="deleted_at IS NOT NULL"),
+    )
 
     message_id = base.Column('bigint', primary_key=True)
-    user_id = base.Column('varchar(255)', nullable=False)
+    user_id = base.Column('bigint', nullable=False)
     channel_id = base.Column('bigint', nullable=False)
-    stream_id = base.Column('varchar(255)', nullable=False)
+    stream_id = base.Column('bigint', nullable=False)
     created_at = base.Column('timestamp', nullable=False)
     edited_at = base.Column('timestamp')
     deleted_at = base.Column('timestamp')
 
 
+class StreamArchive(Stream):
+
+    __tablename__ = "streams_archive"
+    __table_args__ = ()
+
+
+class NotificationArchive(Notification):
+
+    __tablename__ = "notifications_archive"
+    __table_args__ = ()
+
+
 class ChannelDBDriver(base.DBDriver):
 
     def __init__(self, bot):
         super().__init__(bot, Channel)
 
     async def delete_old_channels(self):
-        query = f"DELETE FROM {self.table_name} WHERE id NOT IN (SELECT channel_id FROM {UserChannel.__tablename__})"
-        query += " RETURNING *"
-        records = await self.bot.pool.fetch(query)
+        records = await self.table.delete_unreferenced('id', UserChannel, 'channel_id')
         return [self._get_obj(r) for r in records]
 
 
@@ -79,9 +104,7 @@ class UserDBDriver(base.DBDriver):
         super().__init__(bot, User)
 
     async def delete_old_users(self):
-        query = f"DELETE FROM {self.table_name} WHERE id NOT IN (SELECT user_id FROM {UserChannel.__tablename__})"
-        query += " RETURNING *"
-        records = await self.bot.pool.fetch(query)
+        records = await self.table.delete_unreferenced('id', UserChannel, 'user_id')
         return [self._get_obj(r) for r in records]
 
 
@@ -91,11 +114,7 @@ class UserChannelDBDriver(base.DBDriver):
         super().__init__(bot, UserChannel)
 
     async def bulk_delete(self, channel_id, *user_ids):
-        query = f"DELETE FROM {self.table_name} WHERE channel_id = $1 AND "
-        query += f"({' OR '.join([f'user_id = ${index}' for index in range(2, len(user_ids) + 2)])})"
-        query += " RETURNING *"
-        records = await self.bot.pool.fetch(query, channel_id, *user_ids)
-        return [self._get_obj(r) for r in records]
+        return await self.delete(channel_id=channel_id, user_id=list(user_ids))
 
 
 class StreamDBDriver(base.DBDriver):
@@ -103,8 +122,16 @@ class StreamDBDriver(base.DBDriver):
     def __init__(self, bot):
         super().__init__(bot, Stream)
 
+    async def purge_history(self, before, archive=True):
+        """Remove the streams that ended before a date, moving them to the archive table by default"""
+        return await self.purge('ended_at', before, StreamArchive if archive else None)
+
 
 class NotificationDBDriver(base.DBDriver):
 
     def __init__(self, bot):
         super().__init__(bot, Notification)
+
+    async def purge_history(self, before, archive=True):
+        """Remove the notifications deleted before a date, moving them to the archive table by default"""
+        return await self.purge('deleted_at', before, NotificationArchive if archive else None)
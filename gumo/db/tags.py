@@ -8,7 +8,10 @@ LOG = logging.getLogger(__name__)
 class Tag(base.BaseModel):
 
     __tablename__ = "tags"
-    __table_args__ = base.UniqueConstraint('code', 'guild_id'),
+    __table_args__ = (
+        base.UniqueConstraint('code', 'guild_id'),
+        base.Index('guild_id'),
+    )
 
     code = base.Column('citext', nullable=False)
     content = base.Column('text', nullable=False)
@@ -24,9 +27,5 @@ class TagDBDriver(base.DBDriver):
         super().__init__(bot, Tag)
 
     async def increment_usage(self, code, guild_id=None):
-        query = f"UPDATE {self.table_name} SET usage = usage + 1 " \
-            f"WHERE code = '{code}' and guild_id = {guild_id} RETURNING *"
-        result = await self.bot.pool.fetchrow(query)
-        if result:
-            result = self._get_obj(result)
-        return result
+        records = await self.table.increment('usage', {'code': code, 'guild_id': guild_id})
+        return self._get_obj(records[0]) if records else None
@@ -5,3 +5,4 @@ WHITE_CHECK_MARK = "✅"
 ARROWS_COUNTERCLOCKWISE = "🔄"
 RECYCLING = "♻"
 CROSS_MARK = "❌"
+HOURGLASS = "⏳"
@@ -0,0 +1,135 @@
+import asyncio
+import logging
+
+import asyncpg
+
+from gumo import db
+
+LOG = logging.getLogger(__name__)
+
+# Postgres channel on which the guild ids whose settings changed are sent, as a comma separated list
+NOTIFY_CHANNEL = "guild_settings"
+
+# Delay (in seconds) between two checks of the listening connection
+LISTENER_CHECK_INTERVAL = 30
+
+
+class GuildSettings:
+
+    __slots__ = ('prefixes', 'extensions', 'admin_roles')
+
+    def __init__(self):
+        self.prefixes = set()
+        self.extensions = set()
+        self.admin_roles = set()
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__} prefixes={self.prefixes} extensions={self.extensions} " \
+            f"admin_roles={self.admin_roles}>"
+
+
+class GuildSettingsCache:
+    """Prefixes, enabled extensions and admin roles of the guilds
+
+    The settings of a guild are loaded on first use and kept until they are written. The drivers of the settings
+    invalidate the written guilds, locally and in the other processes sharing the database through a Postgres
+    NOTIFY, so that the checks run on every command cost no query.
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+        self._settings = {}
+
+        # Incremented on each invalidation, the settings loaded meanwhile are returned but not cached
+        self._generation = 0
+
+        # Dedicated connection listening to the notifications, the local invalidations are sent through it so that
+        # they can be told apart by its backend pid
+        self._listener = None
+        self._listener_pid = None
+        self._listener_lock = None
+
+    async def get(self, guild_id):
+        """Return the settings of a guild"""
+        return (await self.get_many([guild_id]))[guild_id]
+
+    async def get_many(self, guild_ids):
+        """Return the settings of several guilds, the missing ones being loaded together
+
+        :return: dict of guild id to settings
+        """
+        # The cached settings are kept aside, they may be invalidated while the missing ones are loaded
+        cached = {guild_id: self._settings[guild_id] for guild_id in guild_ids if guild_id in self._settings}
+        missing_guild_ids = [guild_id for guild_id in guild_ids if guild_id not in cached]
+        if not missing_guild_ids:
+            return cached
+
+        generation = self._generation
+        loaded = {guild_id: GuildSettings() for guild_id in missing_guild_ids}
+        prefixes, extensions, admin_roles = await asyncio.gather(
+            self.bot.prefix_db_driver.list(guild_id=missing_guild_ids),
+            self.bot.extension_db_driver.list(guild_id=missing_guild_ids),
+            self.bot.admin_role_db_driver.list(guild_id=missing_guild_ids))
+
+        for prefix in prefixes:
+            loaded[prefix.guild_id].prefixes.add(prefix.name)
+        for extension in extensions:
+            loaded[extension.guild_id].extensions.add(extension.name)
+        for admin_role in admin_roles:
+            loaded[admin_role.guild_id].admin_roles.add(admin_role.id)
+
+        if generation == self._generation:
+            self._settings.update(loaded)
+        return {**cached, **loaded}
+
+    def _invalidate(self, *guild_ids):
+        self._generation += 1
+        for guild_id in guild_ids:
+            self._settings.pop(guild_id, None)
+
+    def clear(self):
+        self._generation += 1
+        self._settings.clear()
+
+    async def invalidate(self, *guild_ids):
+        """Drop the cached settings of guilds, in this process and in the other ones"""
+        if not guild_ids:
+            return
+        self._invalidate(*guild_ids)
+        payload = ",".join(str(guild_id) for guild_id in guild_ids)
+        if self._listener and not self._listener.is_closed():
+            async with self._listener_lock:
+                await self._listener.execute("SELECT pg_notify($1, $2)", NOTIFY_CHANNEL, payload)
+        elif self.bot.pool:
+            await self.bot.pool.execute("SELECT pg_notify($1, $2)", NOTIFY_CHANNEL, payload)
+
+    def _on_notification(self, connection, pid, channel, payload):
+        if pid == self._listener_pid:
+            return
+        guild_ids = [int(guild_id) for guild_id in payload.split(",")]
+        LOG.debug(f"Guild settings changed: {guild_ids}")
+        self._invalidate(*guild_ids)
+
+    async def listen(self):
+        """Listen to the invalidations sent by the other processes, on a connection of its own"""
+        while True:
+            try:
+                connection = await db.connect()
+                try:
+                    await connection.add_listener(NOTIFY_CHANNEL, self._on_notification)
+                    self._listener_pid = connection.get_server_pid()
+                    self._listener_lock = asyncio.Lock()
+                    self._listener = connection
+
+                    # Any invalidation sent while no connection was listening has been missed
+                    self.clear()
+                    LOG.debug(f"Listening to the '{NOTIFY_CHANNEL}' notifications")
+                    while not connection.is_closed():
+                        await asyncio.sleep(LISTENER_CHECK_INTERVAL)
+                finally:
+                    self._listener = None
+                    await connection.close()
+                LOG.warning(f"The connection listening to the '{NOTIFY_CHANNEL}' notifications has been closed")
+            except (OSError, asyncio.TimeoutError, asyncpg.InterfaceError, asyncpg.PostgresError):
+                LOG.exception(f"Cannot listen to the '{NOTIFY_CHANNEL}' notifications")
+            await asyncio.sleep(LISTENER_CHECK_INTERVAL)
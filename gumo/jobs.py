@@ -0,0 +1,127 @@
+import asyncio
+import collections
+import logging
+
+LOG = logging.getLogger(__name__)
+
+
+class _Listener:
+    """Forward the position updates of a job to a coroutine function, one call at a time and in order"""
+
+    def __init__(self, loop, callback):
+        self._loop = loop
+        self._callback = callback
+        self._task = None
+
+    def notify(self, position):
+        self._task = self._loop.create_task(self._call(self._task, position))
+
+    async def _call(self, previous_task, position):
+        if previous_task:
+            await asyncio.wait([previous_task])
+        try:
+            await self._callback(position)
+        except Exception:
+            LOG.exception(f"The job position listener {self._callback} failed")
+
+
+class Job:
+
+    def __init__(self, loop, key, group, factory, max_group_jobs):
+        self.key = key
+        self.group = group
+        self.factory = factory
+        self.max_group_jobs = max_group_jobs
+        self.future = loop.create_future()
+        self.position = None
+        self.listeners = []
+
+
+class JobQueue:
+    """FIFO queue running jobs with a bounded concurrency, globally and per group.
+
+    Jobs submitted with the same key while a previous one is still pending or running are merged into it, all the
+    submitters get the same result.
+    """
+
+    def __init__(self, loop, max_jobs, max_group_jobs):
+        self._loop = loop
+        self.max_jobs = max_jobs
+        self.max_group_jobs = max_group_jobs
+        self._jobs = {}
+        self._waiting = []
+        self._running = collections.Counter()
+
+    @property
+    def running(self):
+        return sum(self._running.values())
+
+    @property
+    def waiting(self):
+        return len(self._waiting)
+
+    async def submit(self, key, group, factory, on_position=None, max_group_jobs=None):
+        """Run a job, or join the pending job with the same key
+
+        :param key: hashable identifier of the job
+        :param group: the group whose concurrency is limited (e.g. a guild id)
+        :param factory: function returning the coroutine to run
+        :param on_position: optional coroutine function called with the position of the job in the queue each time
+        it changes (0 when the job starts running)
+        :param max_group_jobs: the concurrency limit of the group, the one of the queue by default
+        :return: the result of the job
+        """
+        job = self._jobs.get(key)
+        if job:
+            LOG.debug(f"Job {key} already pending, waiting for its result")
+        else:
+            job = self._jobs[key] = Job(self._loop, key, group, factory, max_group_jobs or self.max_group_jobs)
+            self._waiting.append(job)
+
+        if on_position:
+            listener = _Listener(self._loop, on_position)
+            job.listeners.append(listener)
+            if job.position:
+                listener.notify(job.position)
+
+        self._dispatch()
+        return await asyncio.shield(job.future)
+
+    def _dispatch(self):
+        for job in self._waiting[:]:
+            if self.running >= self.max_jobs:
+                break
+            if self._running[job.group] >= job.max_group_jobs:
+                continue
+            self._waiting.remove(job)
+            self._running[job.group] += 1
+            self._loop.create_task(self._run(job))
+            self._set_position(job, 0)
+
+        for position, job in enumerate(self._waiting, 1):
+            self._set_position(job, position)
+
+    @staticmethod
+    def _set_position(job, position):
+        if job.position == position:
+            return
+        job.position = position
+        for listener in job.listeners:
+            listener.notify(position)
+
+    async def _run(self, job):
+        try:
+            job.future.set_result(await job.factory())
+        except asyncio.CancelledError:
+            raise
+        except Exception as error:
+            job.future.set_exception(error)
+        finally:
+            # Cancelled or interrupted, the waiters must not be left pending
+            if not job.future.done():
+                job.future.cancel()
+            self._running[job.group] -= 1
+            if not self._running[job.group]:
+                del self._running[job.group]
+            del self._jobs[job.key]
+            self._dispatch()
@@ -0,0 +1,56 @@
+import bisect
+import collections
+
+# Upper bounds (in seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class Histogram:
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0
+        self.max = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    @property
+    def mean(self):
+        return self.sum / self.count if self.count else 0
+
+    def quantile(self, q):
+        """Return the upper bound of the bucket containing the q-quantile (the max for the last bucket)"""
+        if not self.count:
+            return 0
+        rank = q * self.count
+        cumulated = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulated += count
+            if cumulated >= rank:
+                return min(bound, self.max)
+        return self.max
+
+
+class Registry:
+    """Collection of statistics objects, created on first access"""
+
+    def __init__(self, factory):
+        self._stats = collections.defaultdict(factory)
+
+    def __getitem__(self, key):
+        return self._stats[key]
+
+    def items(self):
+        return self._stats.items()
+
+    def top(self, n, key):
+        return sorted(self._stats.items(), key=lambda item: key(item[1]), reverse=True)[:n]
+
+    def clear(self):
+        self._stats.clear()
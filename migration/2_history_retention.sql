@@ -0,0 +1,7 @@
+-- The "streams_archive" and "notifications_archive" tables are created from the models
+
+CREATE INDEX IF NOT EXISTS "streams_ended_at_idx"
+    ON "streams" ("ended_at") WHERE "ended_at" IS NOT NULL;
+
+CREATE INDEX IF NOT EXISTS "notifications_deleted_at_idx"
+    ON "notifications" ("deleted_at") WHERE "deleted_at" IS NOT NULL;
@@ -0,0 +1,32 @@
+-- The Twitch ids are numeric strings, they are stored as bigint like the Discord ids
+-- The archive tables may not exist yet, they are then created from the models with the new types
+
+ALTER TABLE "user_channels"
+    DROP CONSTRAINT "user_channels_user_id_fkey";
+
+ALTER TABLE "users"
+    ALTER COLUMN "id" TYPE bigint USING "id"::bigint;
+
+ALTER TABLE "user_channels"
+    ALTER COLUMN "user_id" TYPE bigint USING "user_id"::bigint;
+
+ALTER TABLE "user_channels"
+    ADD CONSTRAINT "user_channels_user_id_fkey" FOREIGN KEY ("user_id") REFERENCES "users" ("id");
+
+ALTER TABLE "streams"
+    ALTER COLUMN "id" TYPE bigint USING "id"::bigint,
+    ALTER COLUMN "user_id" TYPE bigint USING "user_id"::bigint,
+    ALTER COLUMN "game_id" TYPE bigint USING nullif("game_id", '')::bigint;
+
+ALTER TABLE "notifications"
+    ALTER COLUMN "user_id" TYPE bigint USING "user_id"::bigint,
+    ALTER COLUMN "stream_id" TYPE bigint USING "stream_id"::bigint;
+
+ALTER TABLE IF EXISTS "streams_archive"
+    ALTER COLUMN "id" TYPE bigint USING "id"::bigint,
+    ALTER COLUMN "user_id" TYPE bigint USING "user_id"::bigint,
+    ALTER COLUMN "game_id" TYPE bigint USING nullif("game_id", '')::bigint;
+
+ALTER TABLE IF EXISTS "notifications_archive"
+    ALTER COLUMN "user_id" TYPE bigint USING "user_id"::bigint,
+    ALTER COLUMN "stream_id" TYPE bigint USING "stream_id"::bigint;
@@ -0,0 +1,11 @@
+import logging
+import os
+import tempfile
+
+# The gumo package sets up its logger at import time
+os.environ.setdefault('GUMO_LOG_FOLDER', os.path.join(tempfile.gettempdir(), 'gumo-tests'))
+os.environ.setdefault('GUMO_CONFIG_FILE', 'tests.yaml')
+
+import gumo  # noqa: E402
+
+logging.getLogger(gumo.__name__).setLevel(logging.CRITICAL)
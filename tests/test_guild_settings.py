@@ -0,0 +1,68 @@
+import asyncio
+import types
+import unittest
+
+from gumo import guild_settings
+
+
+class StubDriver:
+    """Return the rows of a guild setting, calling a hook while the query is running"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.on_list = None
+
+    async def list(self, guild_id):
+        if self.on_list:
+            self.on_list()
+        await asyncio.sleep(0)
+        return [row for row in self.rows if row.guild_id in guild_id]
+
+
+class GuildSettingsCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.bot = types.SimpleNamespace(
+            pool=None,
+            prefix_db_driver=StubDriver([types.SimpleNamespace(guild_id=1, name="?"),
+                                         types.SimpleNamespace(guild_id=2, name="!")]),
+            extension_db_driver=StubDriver([types.SimpleNamespace(guild_id=2, name="stream")]),
+            admin_role_db_driver=StubDriver([]))
+        self.cache = guild_settings.GuildSettingsCache(self.bot)
+
+    def test_get_many_loads_the_missing_guilds(self):
+        async def run():
+            await self.cache.get(1)
+            return await self.cache.get_many([1, 2])
+
+        settings = asyncio.run(run())
+        self.assertEqual({"?"}, settings[1].prefixes)
+        self.assertEqual({"stream"}, settings[2].extensions)
+
+    def test_get_many_with_a_cached_guild_invalidated_during_the_load(self):
+        async def run():
+            await self.cache.get(1)
+            self.bot.prefix_db_driver.on_list = lambda: self.cache._invalidate(1)
+            return await self.cache.get_many([1, 2])
+
+        settings = asyncio.run(run())
+        self.assertEqual({"?"}, settings[1].prefixes)
+        self.assertEqual({"!"}, settings[2].prefixes)
+        # Neither the invalidated guild nor the guilds loaded meanwhile are cached
+        self.assertNotIn(1, self.cache._settings)
+        self.assertNotIn(2, self.cache._settings)
+
+    def test_own_notifications_are_ignored(self):
+        async def run():
+            await self.cache.get(1)
+            self.cache._listener_pid = 42
+            self.cache._on_notification(None, 42, guild_settings.NOTIFY_CHANNEL, "1")
+            cached_after_own = 1 in self.cache._settings
+            self.cache._on_notification(None, 43, guild_settings.NOTIFY_CHANNEL, "1")
+            return cached_after_own, 1 in self.cache._settings
+
+        self.assertEqual((True, False), asyncio.run(run()))
+
+
+if __name__ == "__main__":
+    unittest.main()